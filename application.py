@@ -1,4 +1,6 @@
-from lilypadz.view import app as application
+from lilypadz.view import app as application, warm_up_on_start
 
+# The job workers import this file as well, only warm up in the server.
 if __name__ == "__main__":
+    warm_up_on_start()
     application.run()
@@ -0,0 +1,267 @@
+"""Time the read, process, cluster and render stages at several sizes.
+
+The small series are rendered per hop for one toad at a time and for the
+toads compared, as the pages draw them, and as the band of each toad.
+
+Run ``python -m lilypadz.benchmark`` from the project root. Each stage is
+timed on its own with cold caches, then all stages are timed together as a
+request would run them, for the first one, some and all of the toads. The
+peak memory of a stage is measured by tracing a separate run, so tracing
+does not slow down the timed runs. The results are saved as JSON, so runs on
+different commits can be compared.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+from statistics import median
+from typing import Callable, Dict, List, NamedTuple, Tuple
+from lilypadz.data.calculate_angle import convert_xyz_to_kinematic
+from lilypadz.model.clustering import CLUSTERING_CACHE, \
+    compute_clustering_result, get_clustering_result
+from lilypadz.model.data_processor import PROCESSED_HOP_CACHE, \
+    get_one_processed_hop, get_toads_processed_hop
+from lilypadz.model.data_reader import get_dataset_version, get_one_hop
+from lilypadz.model.data_store import clear_store_cache
+from lilypadz.model.hop_metadata import METADATA_INDEX_CACHE
+from lilypadz.model.hop_tensor import HOP_TENSOR_CACHE, VARIABLES, \
+    get_hop_tensor
+from lilypadz.model.registry import get_registered_toad_hop
+from lilypadz.model.small_series import get_ss_for_one_toad, \
+    get_ss_for_multiple_toads
+
+# Number of clusters fitted by the cluster stages.
+N_CLUSTERS = 3
+
+
+class BenchmarkResult(NamedTuple):
+    """Timing and memory of one stage at one size."""
+
+    stage: str
+    # Number of toads and hops the stage worked on.
+    toads: int
+    hops: int
+    repeat: int
+    best: float
+    median: float
+    # Largest memory allocated in Python at once while the stage ran.
+    peak_memory: int
+
+
+def clear_caches():
+    """Forget every cached table and result, so that a stage runs cold."""
+    clear_store_cache()
+    PROCESSED_HOP_CACHE.clear()
+    CLUSTERING_CACHE.clear()
+    HOP_TENSOR_CACHE.clear()
+    METADATA_INDEX_CACHE.clear()
+
+
+def _get_name_hops(names: List[str]) -> List[Tuple[str, int]]:
+    """Get the toad and hop number of every hop of some toads."""
+    toad_hop = get_registered_toad_hop()
+    return [(name, hop) for name in names for hop in toad_hop[name]]
+
+
+def _prepare_read(names: List[str]) -> Callable[[], None]:
+    """Read the xyz, angle and force data of every hop."""
+    name_hops = _get_name_hops(names=names)
+    return lambda: [get_one_hop(name=name, hop=hop) for name, hop in name_hops]
+
+
+def _prepare_kinematic(names: List[str]) -> Callable[[], None]:
+    """Calculate the angles of every hop from xyz data read beforehand."""
+    xyz_data = [
+        get_one_hop(name=name, hop=hop).xyz
+        for name, hop in _get_name_hops(names=names)
+    ]
+    return lambda: [convert_xyz_to_kinematic(xyz_data=xyz) for xyz in xyz_data]
+
+
+def _prepare_process(names: List[str]) -> Callable[[], None]:
+    """Read and process every hop one after another, without the cache."""
+    name_hops = _get_name_hops(names=names)
+    return lambda: [
+        get_one_processed_hop(name=name, hop=hop) for name, hop in name_hops
+    ]
+
+
+def _prepare_cluster(names: List[str]) -> Callable[[], None]:
+    """Fit and render the clustering from the hop tensor built beforehand."""
+    get_hop_tensor()
+    return lambda: compute_clustering_result(
+        n_clusters=N_CLUSTERS, names=names, variable=VARIABLES
+    )
+
+
+def _prepare_render_one(names: List[str]) -> Callable[[], None]:
+    """Render the small series of each toad on its own from the hop tensor
+    built beforehand."""
+    get_hop_tensor()
+    return lambda: [
+        get_ss_for_one_toad(name=name, variable=VARIABLES) for name in names
+    ]
+
+
+def _prepare_render_compare(names: List[str]) -> Callable[[], None]:
+    """Render the small series comparing sample hops of the toads from the
+    hop tensor built beforehand."""
+    get_hop_tensor()
+    return lambda: get_ss_for_multiple_toads(names=names, variable=VARIABLES)
+
+
+def _prepare_render(names: List[str]) -> Callable[[], None]:
+    """Render the band of every toad from hops processed beforehand."""
+    get_toads_processed_hop(names=names)
+    return lambda: get_ss_for_multiple_toads(
+        names=names, variable=VARIABLES, aggregate="std"
+    )
+
+
+def _prepare_end_to_end(names: List[str]) -> Callable[[], None]:
+    """Cluster and render the small series from cold caches, as the two
+    requests of a page would."""
+    def end_to_end():
+        clear_caches()
+        get_clustering_result(
+            n_clusters=N_CLUSTERS, names=names, variable=VARIABLES
+        )
+        get_ss_for_multiple_toads(names=names, variable=VARIABLES)
+
+    return end_to_end
+
+
+# Stages to benchmark, each set up by a function that takes the toads and
+# does the untimed work, and returns the function to time.
+BENCHMARK_STAGES: Dict[str, Callable[[List[str]], Callable[[], None]]] = {
+    "read": _prepare_read,
+    "kinematic": _prepare_kinematic,
+    "process": _prepare_process,
+    "cluster": _prepare_cluster,
+    "render_one": _prepare_render_one,
+    "render_compare": _prepare_render_compare,
+    "render": _prepare_render,
+    "end_to_end": _prepare_end_to_end
+}
+
+
+def run_stage(stage: str, names: List[str], repeat: int) -> BenchmarkResult:
+    """Time one stage on some toads, setting it up from cold caches.
+
+    :param stage: The stage to time, one of BENCHMARK_STAGES.
+    :param names: Names of the toads to work on.
+    :param repeat: Number of timed runs.
+    :return: The best and median time in seconds and the peak memory.
+    """
+    timings = []
+    for _ in range(repeat):
+        clear_caches()
+        run = BENCHMARK_STAGES[stage](names)
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    # Trace one more run, tracing slows down every allocation.
+    clear_caches()
+    run = BENCHMARK_STAGES[stage](names)
+    tracemalloc.start()
+    run()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return BenchmarkResult(
+        stage=stage,
+        toads=len(names),
+        hops=len(_get_name_hops(names=names)),
+        repeat=repeat,
+        best=min(timings),
+        median=median(timings),
+        peak_memory=peak_memory
+    )
+
+
+def run_benchmark(sizes: List[int],
+                  stages: List[str],
+                  repeat: int) -> List[BenchmarkResult]:
+    """Time every stage at every size.
+
+    :param sizes: Numbers of toads to work on, the first ones by name.
+    :param stages: The stages to time, some of BENCHMARK_STAGES.
+    :param repeat: Number of timed runs of each stage at each size.
+    :return: The result of each stage at each size.
+    """
+    names = list(get_registered_toad_hop().keys())
+
+    return [
+        run_stage(stage=stage, names=names[:size], repeat=repeat)
+        for size in sizes
+        for stage in stages
+    ]
+
+
+def get_default_sizes() -> List[int]:
+    """Get the sizes to time by default: one, half and all of the toads."""
+    count = len(get_registered_toad_hop())
+    return sorted({1, max(count // 2, 1), count})
+
+
+def save_benchmark(results: List[BenchmarkResult], path: str):
+    """Save the results with what they were measured on.
+
+    :param results: The result of each stage at each size.
+    :param path: The JSON file to write.
+    """
+    with open(path, "w") as benchmark_file:
+        json.dump({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset_version": get_dataset_version(),
+            "results": [result._asdict() for result in results]
+        }, benchmark_file, indent=2)
+
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=None,
+        help="Numbers of toads to work on, default to one, half and all."
+    )
+    parser.add_argument(
+        "--stages", nargs="+", choices=list(BENCHMARK_STAGES),
+        default=list(BENCHMARK_STAGES), help="Stages to time, default to all."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Number of timed runs of each stage at each size."
+    )
+    parser.add_argument(
+        "--output", default="benchmark.json",
+        help="JSON file to save the results to."
+    )
+    arguments = parser.parse_args()
+
+    count = len(get_registered_toad_hop())
+    sizes = arguments.sizes or get_default_sizes()
+    for size in sizes:
+        if not 1 <= size <= count:
+            parser.error(f"size {size} is not between 1 and {count}")
+
+    results = run_benchmark(
+        sizes=sizes, stages=arguments.stages, repeat=arguments.repeat
+    )
+    for result in results:
+        print(f"{result.stage:>14} {result.toads:>4} toads {result.hops:>6} "
+              f"hops {result.best:>9.3f} s {result.median:>9.3f} s "
+              f"{result.peak_memory / 2 ** 20:>9.1f} MiB", file=sys.stderr)
+
+    save_benchmark(results=results, path=arguments.output)
+
+
+if __name__ == "__main__":
+    main()
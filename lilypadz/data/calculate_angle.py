@@ -1,9 +1,121 @@
-"""Run the file manually to find all angle data."""
+"""Find all angle data from the XYZ data.
 
-import math
+Run ``python -m lilypadz.data.calculate_angle`` from the project root to
+regenerate the angle.csv file of every hop whose xyz.csv changed since the
+last run, or whose angle.csv is missing.
+"""
+
+import io
+import os
+import json
+import hashlib
+import argparse
 import numpy as np
 import pandas as pd
-from lilypadz.helper.constant import TOAD_HOP
+from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from lilypadz.helper.constant import DATA_PATH
+from lilypadz.model.registry import get_registered_toad_hop
+
+# Names of the kinematic variables saved in angle.csv.
+ANGLE_COLUMNS = ["Elbow_Flex_Ext", "Humeral_Pro_Ret", "Humeral_Dep_Ele"]
+
+# Content hashes of each xyz.csv and the angle.csv derived from it.
+MANIFEST_PATH = f"{DATA_PATH}/angle_manifest.json"
+
+
+def _distance(point_a: np.ndarray, point_b: np.ndarray) -> np.ndarray:
+    """Calculate the distance between two arrays of points.
+
+    :param point_a: Points whose last axis holds the X, Y, Z values.
+    :param point_b: Points whose last axis holds the X, Y, Z values.
+    :return: The distance between each pair of points.
+    """
+    difference = (point_a - point_b) ** 2
+
+    return np.sqrt(
+        difference[..., 0] + difference[..., 1] + difference[..., 2]
+    )
+
+
+def _angle(opposite: np.ndarray,
+           side_a: np.ndarray,
+           side_b: np.ndarray,
+           supplementary: bool = False) -> np.ndarray:
+    """Calculate an angle of triangles by the law of cosines.
+
+    :param opposite: Length of the side opposite to the angle.
+    :param side_a: Length of one side next to the angle.
+    :param side_b: Length of the other side next to the angle.
+    :param supplementary: Whether to give 180 minus the angle instead.
+    :return: The angle in degrees, 0 where a side next to it has length 0.
+    """
+    denominator = -2 * side_a * side_b
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        angle = np.degrees(np.arccos(
+            (opposite ** 2 - side_a ** 2 - side_b ** 2) / denominator
+        ))
+
+    return np.where(
+        denominator == 0, 0, 180 - angle if supplementary else angle
+    )
+
+
+def calculate_kinematic_angle(points: np.ndarray) -> np.ndarray:
+    """Calculate three kinematic variables from an array of points.
+
+    :param points: An array whose last two axes are points and their X, Y, Z
+        values, such as (frame, point, 3) for a hop or (hop, frame, point, 3)
+        for a stack of hops. The first six points are used, but a NaN value
+        in any point empties the whole frame.
+    :return: An array whose last axis holds the elbow flexion/extension,
+        humeral protraction/retraction and humeral depression/elevation.
+    """
+    pt1, pt2, pt3, pt4, pt5, pt6 = [
+        points[..., index, :] for index in range(6)
+    ]
+
+    # Calculate Elbow Flexion/Extraction
+    elbow_flex_ext = _angle(
+        opposite=_distance(pt4, pt6),
+        side_a=_distance(pt4, pt5),
+        side_b=_distance(pt5, pt6)
+    )
+
+    # Calculate Humeral Protraction/Retraction
+    pt5_2 = pt5 + (pt2 - pt4)
+    humeral_pro_ret = _angle(
+        opposite=_distance(pt5_2, pt1),
+        side_a=_distance(pt1, pt2),
+        side_b=_distance(pt2, pt5_2),
+        supplementary=True
+    )
+
+    # Calculate Humeral Depression/Elevation
+    pt5_3 = pt5 + (pt3 - pt4)
+    humeral_dep_ele = _angle(
+        opposite=_distance(pt5_3, pt2),
+        side_a=_distance(pt3, pt5_3),
+        side_b=_distance(pt3, pt2),
+        supplementary=True
+    )
+
+    angle = np.stack(
+        [elbow_flex_ext, humeral_pro_ret, humeral_dep_ele], axis=-1
+    )
+
+    # If the frame contains any empty data, make the entire angle frame empty.
+    angle[np.isnan(points).any(axis=(-2, -1))] = np.nan
+
+    return angle
+
+
+def _get_points(xyz_data: pd.DataFrame) -> np.ndarray:
+    """Reshape the XYZ data to an array of (frame, point, 3)."""
+    return xyz_data.to_numpy(dtype=np.float64).reshape(
+        len(xyz_data.index), -1, 3
+    )
 
 
 def convert_xyz_to_kinematic(xyz_data: pd.DataFrame) -> pd.DataFrame:
@@ -12,122 +124,197 @@ def convert_xyz_to_kinematic(xyz_data: pd.DataFrame) -> pd.DataFrame:
     :param xyz_data: xyz data of a hop of a specific toad.
     :return: a pandas DataFrame that holds the kinematic variables.
     """
+    return pd.DataFrame(
+        calculate_kinematic_angle(points=_get_points(xyz_data=xyz_data)),
+        columns=ANGLE_COLUMNS
+    )
+
 
-    # Create a data frame for kinematic data.
-    angle_data = pd.DataFrame(
-        columns=['Elbow_Flex_Ext', 'Humeral_Pro_Ret', 'Humeral_Dep_Ele']
+def convert_hops_to_kinematic(
+        xyz_data: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    """Calculate three kinematic variables for many hops in one pass.
+
+    :param xyz_data: xyz data of the hops of interest.
+    :return: a pandas DataFrame of kinematic variables for each hop.
+    """
+    points = [_get_points(xyz_data=data) for data in xyz_data]
+
+    # Stack the hops, padding missing frames with NaN and missing points
+    # with 0 so that they do not empty the frame.
+    stacked = np.full(
+        (len(points),
+         max([len(hop) for hop in points], default=0),
+         max([hop.shape[1] for hop in points], default=6),
+         3),
+        np.nan
     )
+    for index, hop in enumerate(points):
+        stacked[index, :len(hop), hop.shape[1]:] = 0
+        stacked[index, :len(hop), :hop.shape[1]] = hop
 
-    # Iterate over rows to find the angle data for each row.
-    for index, row in xyz_data.iterrows():
-        # If the row contains any empty data, make the entire angle row empty.
-        if row.isnull().values.any():
-            elbow_flex_ext = np.NaN
-            humeral_pro_ret = np.NaN
-            humeral_dep_ele = np.NaN
-
-        # Do the proper calculations.
-        else:
-            # Calculate Elbow Flexion/Extraction
-            seg_a = math.sqrt(
-                (row['pt4_X'] - row['pt5_X']) ** 2 +
-                (row['pt4_Y'] - row['pt5_Y']) ** 2 +
-                (row['pt4_Z'] - row['pt5_Z']) ** 2
-            )
-            seg_b = math.sqrt(
-                (row['pt5_X'] - row['pt6_X']) ** 2 +
-                (row['pt5_Y'] - row['pt6_Y']) ** 2 +
-                (row['pt5_Z'] - row['pt6_Z']) ** 2
-            )
-            seg_c = math.sqrt(
-                (row['pt4_X'] - row['pt6_X']) ** 2 +
-                (row['pt4_Y'] - row['pt6_Y']) ** 2 +
-                (row['pt4_Z'] - row['pt6_Z']) ** 2
-            )
-            try:
-                elbow_flex_ext = math.degrees(
-                    math.acos(
-                        (seg_c ** 2 - seg_a ** 2 - seg_b ** 2) /
-                        (-2 * seg_a * seg_b)
-                    )
-                )
-            except ZeroDivisionError:
-                elbow_flex_ext = 0
-
-            # Calculate Humeral Protraction/Retraction
-            pt5_x2 = row['pt5_X'] + (row['pt2_X'] - row['pt4_X'])
-            pt5_y2 = row['pt5_Y'] + (row['pt2_Y'] - row['pt4_Y'])
-            pt5_z2 = row['pt5_Z'] + (row['pt2_Z'] - row['pt4_Z'])
-            seg_d = math.sqrt(
-                (row['pt1_X'] - row['pt2_X']) ** 2 +
-                (row['pt1_Y'] - row['pt2_Y']) ** 2 +
-                (row['pt1_Z'] - row['pt2_Z']) ** 2
-            )
-            seg_e = math.sqrt(
-                (row['pt2_X'] - pt5_x2) ** 2 +
-                (row['pt2_Y'] - pt5_y2) ** 2 +
-                (row['pt2_Z'] - pt5_z2) ** 2
-            )
-            seg_f = math.sqrt(
-                (pt5_x2 - row['pt1_X']) ** 2 +
-                (pt5_y2 - row['pt1_Y']) ** 2 +
-                (pt5_z2 - row['pt1_Z']) ** 2
-            )
-            try:
-                humeral_pro_ret = 180 - math.degrees(
-                    math.acos(
-                        (seg_f ** 2 - seg_d ** 2 - seg_e ** 2) /
-                        (-2 * seg_d * seg_e)
-                    )
-                )
-            except ZeroDivisionError:
-                humeral_pro_ret = 0
-
-            # Calculate Humeral Depression/Elevation
-            pt5_x3 = row['pt5_X'] + (row['pt3_X'] - row['pt4_X'])
-            pt5_y3 = row['pt5_Y'] + (row['pt3_Y'] - row['pt4_Y'])
-            pt5_z3 = row['pt5_Z'] + (row['pt3_Z'] - row['pt4_Z'])
-            seg_g = math.sqrt(
-                (row['pt3_X'] - row['pt2_X']) ** 2 +
-                (row['pt3_Y'] - row['pt2_Y']) ** 2 +
-                (row['pt3_Z'] - row['pt2_Z']) ** 2
-            )
-            seg_h = math.sqrt(
-                (row['pt3_X'] - pt5_x3) ** 2 +
-                (row['pt3_Y'] - pt5_y3) ** 2 +
-                (row['pt3_Z'] - pt5_z3) ** 2
-            )
-            seg_i = math.sqrt(
-                (pt5_x3 - row['pt2_X']) ** 2 +
-                (pt5_y3 - row['pt2_Y']) ** 2 +
-                (pt5_z3 - row['pt2_Z']) ** 2
+    angle = calculate_kinematic_angle(points=stacked)
+
+    return [
+        pd.DataFrame(angle[index, :len(hop)], columns=ANGLE_COLUMNS)
+        for index, hop in enumerate(points)
+    ]
+
+
+def hash_file(path: str) -> str:
+    """Get the SHA-256 hash of the content of a file.
+
+    :param path: The file of interest.
+    """
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def load_manifest() -> Dict[str, Dict[str, str]]:
+    """Load the manifest, an empty one if it does not exist yet.
+
+    :return: A dictionary where the key is "toad/hop" and the item holds the
+        hashes of the xyz and angle files.
+    """
+    try:
+        with open(MANIFEST_PATH) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest: Dict[str, Dict[str, str]]):
+    """Save the manifest, replacing the old one at once.
+
+    :param manifest: The hashes of the xyz and angle files of each hop.
+    """
+    with open(f"{MANIFEST_PATH}.tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(f"{MANIFEST_PATH}.tmp", MANIFEST_PATH)
+
+
+def is_outdated(name: str, hop: int, manifest: Dict[str, Dict[str, str]]):
+    """Check whether the angle data of a hop needs to be recalculated.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :param manifest: The hashes recorded by the last run.
+    :return: True if the xyz or angle file changed or the angle file is gone.
+    """
+    record = manifest.get(f"{name}/{hop}")
+    angle_path = f"{DATA_PATH}/{name}/{hop}/angle.csv"
+
+    return record is None or \
+        not os.path.exists(angle_path) or \
+        record["xyz"] != hash_file(f"{DATA_PATH}/{name}/{hop}/xyz.csv") or \
+        record["angle"] != hash_file(angle_path)
+
+
+def save_kinematic_data(name_hop: Tuple[str, int]) -> Dict[str, str]:
+    """Calculate and save the angle data of one hop of a specific toad.
+
+    :param name_hop: The toad of interest and the hop number of interest.
+    :return: The hashes of the xyz file read and the angle file written.
+    """
+    name, hop = name_hop
+
+    # Hash the same bytes that are parsed.
+    with open(f"{DATA_PATH}/{name}/{hop}/xyz.csv", "rb") as xyz_file:
+        xyz_content = xyz_file.read()
+
+    xyz_data = pd.read_csv(io.BytesIO(xyz_content))
+    angle_data = convert_xyz_to_kinematic(xyz_data=xyz_data)
+    angle_data.to_csv(f"{DATA_PATH}/{name}/{hop}/angle.csv")
+
+    return {
+        "xyz": hashlib.sha256(xyz_content).hexdigest(),
+        "angle": hash_file(f"{DATA_PATH}/{name}/{hop}/angle.csv")
+    }
+
+
+def save_all_kinematic_data(names: List[str] = None,
+                            workers: int = None,
+                            force: bool = False) -> List[Tuple[str, int]]:
+    """Calculate and save the angle data of outdated hops across processes.
+
+    :param names: The toads of interest, default to all toads.
+    :param workers: Number of processes to use, default to number of cores.
+    :param force: Whether to recalculate every hop, even if it is up to date.
+    :return: The toad and hop number of each recalculated hop.
+    """
+    toad_hop = get_registered_toad_hop(tables=["xyz"])
+    names = list(toad_hop.keys()) if names is None else names
+    manifest = load_manifest()
+    name_hops = [
+        (name, hop) for name in names for hop in toad_hop[name]
+        if force or is_outdated(name=name, hop=hop, manifest=manifest)
+    ]
+
+    if name_hops:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            records = executor.map(
+                save_kinematic_data, name_hops, chunksize=4
             )
-            try:
-                humeral_dep_ele = 180 - math.degrees(
-                    math.acos(
-                        (seg_i ** 2 - seg_h ** 2 - seg_g ** 2) /
-                        (-2 * seg_g * seg_h)
-                    )
-                )
-            except ZeroDivisionError:
-                humeral_dep_ele = 0
-
-        angle_data = angle_data.append(
-            {'Elbow_Flex_Ext': elbow_flex_ext,
-             'Humeral_Pro_Ret': humeral_pro_ret,
-             'Humeral_Dep_Ele': humeral_dep_ele},
-            ignore_index=True
-        )
+            for (name, hop), record in zip(name_hops, records):
+                manifest[f"{name}/{hop}"] = record
+
+        save_manifest(manifest=manifest)
+
+    return name_hops
+
 
-    return angle_data
+def record_kinematic_data(names: List[str] = None):
+    """Record the current xyz and angle files in the manifest as up to date.
 
+    :param names: The toads of interest, default to all toads.
+    """
+    toad_hop = get_registered_toad_hop(tables=["xyz", "angle"])
+    names = list(toad_hop.keys()) if names is None else names
+    manifest = load_manifest()
+
+    for name in names:
+        for hop in toad_hop[name]:
+            manifest[f"{name}/{hop}"] = {
+                "xyz": hash_file(f"{DATA_PATH}/{name}/{hop}/xyz.csv"),
+                "angle": hash_file(f"{DATA_PATH}/{name}/{hop}/angle.csv")
+            }
+
+    save_manifest(manifest=manifest)
 
-def save_all_kinematic_data():
-    for name, hops in TOAD_HOP.items():
-        for hop in hops:
-            xyz_data = pd.read_csv(f"{name}/{hop}/xyz.csv")
-            angle_data = convert_xyz_to_kinematic(xyz_data=xyz_data)
-            angle_data.to_csv(f"{name}/{hop}/angle.csv")
+
+def main():
+    """Regenerate the angle data from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "names", nargs="*", help="Toads to regenerate, default to all toads."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of processes to use, default to number of cores."
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Recalculate every hop, even if it is up to date."
+    )
+    parser.add_argument(
+        "--record", action="store_true",
+        help="Record the current files as up to date without recalculating."
+    )
+    arguments = parser.parse_args()
+
+    for name in arguments.names:
+        if name not in get_registered_toad_hop():
+            parser.error(f"unknown toad {name}")
+
+    if arguments.record:
+        record_kinematic_data(names=arguments.names or None)
+    else:
+        name_hops = save_all_kinematic_data(
+            names=arguments.names or None,
+            workers=arguments.workers,
+            force=arguments.force
+        )
+        print(f"Recalculated {len(name_hops)} hops.")
 
 
-save_all_kinematic_data()
+if __name__ == "__main__":
+    main()
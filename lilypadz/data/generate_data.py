@@ -0,0 +1,443 @@
+"""Generate synthetic toads in the layout of the recorded data.
+
+Run ``python -m lilypadz.data.generate_data <path>`` from the project root
+to write synthetic toads under a data directory, then point the app to it
+with ``LILYPADZ_DATA_PATH=<path>``. Each toad gets a time.csv and a folder
+of xyz.csv, angle.csv and force.csv for each hop, and its hops are added to
+All Hopping Info.csv. The same seed always writes the same data.
+
+The forelimb of a hop is moved through its four phases by smooth joint
+angles, and the six points of xyz.csv are placed from those angles, so the
+angles calculated back from them follow the same shape. The force plate
+records the impact of the landing followed by the weight of the toad.
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List, NamedTuple
+from lilypadz.data.calculate_angle import convert_xyz_to_kinematic
+
+# Names and mean length in frames of the phases of a hop, in order.
+HOP_PHASES = {
+    "Initiation": 52,
+    "Forelimb LO": 44,
+    "Impact Prep": 62,
+    "Landing": 56
+}
+
+# Elbow flexion/extension, humeral protraction/retraction and humeral
+# depression/elevation in degrees at the start of the hop and at the end of
+# each phase.
+ANGLE_KEYFRAMES = np.array([
+    [75, 70, 45],
+    [100, 60, 40],
+    [65, 100, 60],
+    [115, 140, 55],
+    [80, 100, 45]
+], dtype=np.float64)
+
+# Length of the segments between the points of the forelimb.
+SEGMENT_LENGTH = {"body": 0.6, "shoulder": 1.0, "humerus": 1.3, "arm": 1.9}
+
+# Offset of the shoulder joint from the third point of the body.
+SHOULDER_OFFSET = np.array([0.0, -2.2, -2.0])
+
+# Number of samples recorded by the force plate for each hop.
+FORCE_SAMPLES = 3000
+
+# Seconds between two frames of the xyz data.
+FRAME_TIME = 0.002
+
+# Columns of All Hopping Info.csv, with its original spelling.
+HOP_INFO_COLUMNS = [
+    "ID", "Hop Number", "Hop Length", "Hop Phase", "Sight", "Max Extension",
+    "Max Protraction", "Max Elevattion", "Max Flexion", "Max Retraction",
+    "Max Depression", "Phase Duration (s)", "Initial Elb", "Initial Pro/Ret",
+    "Intial Elev/Dep", "Final Elb", "Final Pro/Ret", "Final Elev/Dep",
+    "Mean Elb", "Mean Pro/Ret", "Mean Elev/Dep", "Hop Duration",
+    "Elb Ang Vel", "HPR Ang Vel", "HED Ang Vel", "Hop Duration (s)",
+    "Max Extension-Max Flexion"
+]
+
+
+class SyntheticHop(NamedTuple):
+    """Data structure of one generated hop, laid out as the files."""
+
+    xyz: pd.DataFrame
+    force: pd.DataFrame
+    # The row of the hop in time.csv.
+    timing: dict
+    # The row of each phase of the hop in All Hopping Info.csv.
+    info: List[dict]
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    """Scale each vector on the last axis to a length of one."""
+    return vector / np.linalg.norm(vector, axis=-1, keepdims=True)
+
+
+def generate_phases(rng: np.random.Generator) -> np.ndarray:
+    """Draw the length in frames of each phase of a hop.
+
+    :param rng: The random generator.
+    :return: The number of frames of each phase of HOP_PHASES.
+    """
+    means = np.array(list(HOP_PHASES.values()), dtype=np.float64)
+    return np.maximum(
+        rng.normal(means, means / 3).round().astype(int), 8
+    )
+
+
+def generate_angles(rng: np.random.Generator,
+                    phases: np.ndarray,
+                    toad_offset: np.ndarray) -> np.ndarray:
+    """Draw smooth joint angles through the phases of a hop.
+
+    :param rng: The random generator.
+    :param phases: The number of frames of each phase.
+    :param toad_offset: How far the angles of the toad are from the usual.
+    :return: An array of (frame, 3) with the elbow flexion/extension,
+        humeral protraction/retraction and humeral depression/elevation.
+    """
+    keyframes = ANGLE_KEYFRAMES + toad_offset + \
+        rng.normal(0, 6, ANGLE_KEYFRAMES.shape)
+    bounds = np.concatenate([[0], np.cumsum(phases)])
+
+    # Ease between the keyframes, so the joints speed up and slow down.
+    frame = np.arange(bounds[-1])
+    phase = np.searchsorted(bounds, frame, side="right") - 1
+    progress = (frame - bounds[phase]) / phases[phase]
+    ease = (1 - np.cos(np.pi * progress)) / 2
+
+    return keyframes[phase] + \
+        (keyframes[phase + 1] - keyframes[phase]) * ease[:, np.newaxis]
+
+
+def place_points(rng: np.random.Generator,
+                 angles: np.ndarray,
+                 phases: np.ndarray) -> np.ndarray:
+    """Place the six tracked points of the forelimb from its joint angles.
+
+    :param rng: The random generator.
+    :param angles: The joint angles of each frame, as from generate_angles.
+    :param phases: The number of frames of each phase.
+    :return: An array of (frame, point, 3) with the X, Y, Z values.
+    """
+    num_frame = len(angles)
+    elbow, pro_ret, dep_ele = np.radians(angles).T
+
+    # The body leaps forward and up between lift off and the first touch.
+    leap_start = phases[0]
+    leap_end = phases[0] + phases[1] + phases[2]
+    leap = np.clip(
+        (np.arange(num_frame) - leap_start) / (leap_end - leap_start), 0, 1
+    )
+    distance = rng.uniform(30, 45)
+    body = np.stack([
+        -8 + distance * (1 - np.cos(np.pi * leap)) / 2,
+        4 + rng.uniform(3, 6) * np.sin(np.pi * leap),
+        np.full(num_frame, 15.0)
+    ], axis=-1)
+
+    # The body pitches up during the leap, the shoulder points down.
+    pitch = np.radians(rng.uniform(5, 20)) * np.sin(np.pi * leap)
+    forward = np.stack(
+        [np.cos(pitch), np.sin(pitch), np.zeros(num_frame)], axis=-1
+    )
+    down = np.tile([0.0, 0.0, -1.0], (num_frame, 1))
+    side = np.cross(forward, down)
+
+    # Protraction is the angle of the humerus to the body, elevation sets
+    # how far it turns from the shoulder to the side.
+    turn = np.arccos(np.clip(
+        np.cos(dep_ele) / np.sin(pro_ret), -1, 1
+    ))[:, np.newaxis]
+    humerus = np.cos(pro_ret)[:, np.newaxis] * forward + \
+        np.sin(pro_ret)[:, np.newaxis] * (
+            np.cos(turn) * down + np.sin(turn) * side
+        )
+
+    # The arm bends away from the humerus by the elbow angle.
+    bend = _unit(np.cross(humerus, side))
+    arm = np.cos(elbow)[:, np.newaxis] * -humerus + \
+        np.sin(elbow)[:, np.newaxis] * bend
+
+    pt1 = body
+    pt2 = pt1 + SEGMENT_LENGTH["body"] * forward
+    pt3 = pt2 + SEGMENT_LENGTH["shoulder"] * down
+    pt4 = pt3 + SHOULDER_OFFSET
+    pt5 = pt4 + SEGMENT_LENGTH["humerus"] * humerus
+    pt6 = pt5 + SEGMENT_LENGTH["arm"] * arm
+
+    # Tracking is never exact.
+    points = np.stack([pt1, pt2, pt3, pt4, pt5, pt6], axis=1)
+    return points + rng.normal(0, 0.01, points.shape)
+
+
+def generate_force(rng: np.random.Generator, landing: int) -> np.ndarray:
+    """Draw the force plate record of a toad landing on the plate.
+
+    :param rng: The random generator.
+    :param landing: The sample where the toad touches the plate.
+    :return: An array of (sample, 6) with the fore-aft, lateral and normal
+        forces followed by the three moments.
+    """
+    after = np.maximum(np.arange(FORCE_SAMPLES) - landing, 0)
+
+    # A sharp impact that settles to the weight of the toad.
+    impact = (after / 8) ** 2 * np.exp(2 - after / 8) / 4
+    weight = 1 - np.exp(-after / 30)
+
+    peak = rng.uniform(1.8, 3.0)
+    body_weight = rng.uniform(0.8, 1.2)
+    shapes = np.stack([
+        -0.1 - 0.3 * peak * impact - 0.05 * weight,
+        0.15 + rng.uniform(-0.1, 0.1) * peak * impact,
+        -0.15 + peak * impact + body_weight * weight,
+        -0.012 + 0.005 * impact,
+        0.006 + 0.02 * impact,
+        -0.008 + 0.02 * impact
+    ], axis=-1)
+
+    noise = rng.normal(0, [0.01, 0.01, 0.01, 0.001, 0.001, 0.001],
+                       shapes.shape)
+    return shapes + noise
+
+
+def summarize_phases(angle_data: pd.DataFrame,
+                     phases: np.ndarray) -> List[dict]:
+    """Summarize the angles of each phase as in All Hopping Info.csv.
+
+    :param angle_data: The calculated angles of the tracked frames.
+    :param phases: The number of frames of each phase.
+    :return: The angle columns of the row of each phase.
+    """
+    bounds = np.concatenate([[0], np.cumsum(phases)])
+    rows = []
+
+    for index, length in enumerate(phases):
+        elb, pro, dep = angle_data.iloc[
+            bounds[index]:bounds[index + 1]
+        ].to_numpy().T
+        duration = length * FRAME_TIME
+        rows.append({
+            "Max Extension": elb.max(),
+            "Max Protraction": pro.max(),
+            "Max Elevattion": dep.max(),
+            "Max Flexion": elb.min(),
+            "Max Retraction": pro.min(),
+            "Max Depression": dep.min(),
+            "Phase Duration (s)": int(length),
+            "Initial Elb": elb[0],
+            "Initial Pro/Ret": pro[0],
+            "Intial Elev/Dep": dep[0],
+            "Final Elb": elb[-1],
+            "Final Pro/Ret": pro[-1],
+            "Final Elev/Dep": dep[-1],
+            "Mean Elb": elb.mean(),
+            "Mean Pro/Ret": pro.mean(),
+            "Mean Elev/Dep": dep.mean(),
+            "Hop Duration": int(phases.sum()),
+            "Elb Ang Vel": (elb[0] - elb[-1]) / duration,
+            "HPR Ang Vel": (pro[0] - pro[-1]) / duration,
+            "HED Ang Vel": (dep[0] - dep[-1]) / duration,
+            "Hop Duration (s)": duration,
+            "Max Extension-Max Flexion": np.nan
+        })
+
+    return rows
+
+
+def generate_hop(rng: np.random.Generator,
+                 name: str,
+                 hop: int,
+                 toad_offset: np.ndarray) -> SyntheticHop:
+    """Generate the data of one hop of a toad.
+
+    :param rng: The random generator.
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :param toad_offset: How far the angles of the toad are from the usual.
+    :return: The xyz and force data and the rows of the hop.
+    """
+    phases = generate_phases(rng=rng)
+    angles = generate_angles(
+        rng=rng, phases=phases, toad_offset=toad_offset
+    )
+    points = place_points(rng=rng, angles=angles, phases=phases)
+
+    # The camera only tracks the forelimb for a part of the recording.
+    track_start = int(rng.integers(20, 60))
+    first_touch = track_start + int(phases[:3].sum())
+    recovery = first_touch + int(rng.integers(150, 220))
+    num_frame = max(recovery, track_start + len(points)) + \
+        int(rng.integers(10, 40))
+
+    xyz = np.full((num_frame, 6, 3), np.nan)
+    xyz[track_start:track_start + len(points)] = points
+    xyz_data = pd.DataFrame(
+        xyz.reshape(num_frame, -1),
+        columns=[
+            f"pt{point}_{axis}" for point in range(1, 7) for axis in "XYZ"
+        ]
+    )
+
+    # Time counts down to the onset, two units for each frame.
+    onset = round(2 * num_frame + rng.uniform(50, 1000), 1)
+
+    sight = rng.choice(["Sighted", "Blind"])
+    hop_length = rng.choice(["S", "SM", "M", "ML", "L"])
+    tracked = convert_xyz_to_kinematic(
+        xyz_data=xyz_data
+    ).iloc[track_start:track_start + len(points)]
+
+    return SyntheticHop(
+        xyz=xyz_data,
+        force=pd.DataFrame(generate_force(
+            rng=rng, landing=int(rng.integers(600, 2200))
+        )),
+        timing={
+            "Hop": hop,
+            "Onset": onset,
+            "First Touch": round(onset - 2 * first_touch, 1),
+            "Recovery": round(onset - 2 * recovery, 1)
+        },
+        info=[
+            {
+                "ID": name,
+                "Hop Number": hop,
+                "Hop Length": hop_length,
+                "Hop Phase": phase,
+                "Sight": sight,
+                **row
+            }
+            for phase, row in zip(
+                HOP_PHASES, summarize_phases(angle_data=tracked, phases=phases)
+            )
+        ]
+    )
+
+
+def save_hop(path: str, name: str, hop: int, synthetic_hop: SyntheticHop):
+    """Write the files of one hop as the recorded hops are written.
+
+    :param path: The data directory.
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :param synthetic_hop: The generated hop.
+    """
+    hop_path = f"{path}/{name}/{hop}"
+    os.makedirs(hop_path, exist_ok=True)
+
+    synthetic_hop.xyz.to_csv(
+        f"{hop_path}/xyz.csv", index=False, float_format="%.6f"
+    )
+    convert_xyz_to_kinematic(xyz_data=synthetic_hop.xyz).to_csv(
+        f"{hop_path}/angle.csv"
+    )
+
+    # The force plate files have no header, their first sample is read as it.
+    synthetic_hop.force.to_csv(
+        f"{hop_path}/force.csv", index=False, header=False,
+        float_format="%.5f"
+    )
+
+
+def generate_toads(path: str,
+                   num_toads: int,
+                   num_hops: int,
+                   seed: int = 0,
+                   prefix: str = "Synthetic") -> Dict[str, List[int]]:
+    """Write synthetic toads under a data directory.
+
+    Toads of the same names are replaced, other toads are kept.
+
+    :param path: The data directory.
+    :param num_toads: Number of toads to generate.
+    :param num_hops: Number of hops of each toad.
+    :param seed: Seed of the random generator, same seed same data.
+    :param prefix: Start of the toad names, followed by their number.
+    :return: A dictionary where the key is toad and the item is its hops.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"{prefix}{index + 1}" for index in range(num_toads)]
+    info_rows = []
+
+    for name in names:
+        toad_offset = rng.normal(0, 5, ANGLE_KEYFRAMES.shape[1])
+        timing_rows = []
+
+        for hop in range(1, num_hops + 1):
+            synthetic_hop = generate_hop(
+                rng=rng, name=name, hop=hop, toad_offset=toad_offset
+            )
+            save_hop(path=path, name=name, hop=hop,
+                     synthetic_hop=synthetic_hop)
+            timing_rows.append(synthetic_hop.timing)
+            info_rows.extend(synthetic_hop.info)
+
+        pd.DataFrame(timing_rows).to_csv(
+            f"{path}/{name}/time.csv", index=False, encoding="utf-8-sig"
+        )
+
+    save_hop_info(path=path, names=names, rows=info_rows)
+
+    return {name: list(range(1, num_hops + 1)) for name in names}
+
+
+def save_hop_info(path: str, names: List[str], rows: List[dict]):
+    """Replace the rows of some toads in All Hopping Info.csv.
+
+    :param path: The data directory.
+    :param names: The toads whose rows are replaced.
+    :param rows: The new rows of the toads.
+    """
+    info_path = f"{path}/All Hopping Info.csv"
+    new_info = pd.DataFrame(rows, columns=HOP_INFO_COLUMNS)
+
+    if os.path.exists(info_path):
+        old_info = pd.read_csv(info_path)
+        new_info = pd.concat(
+            [old_info[~old_info["ID"].isin(names)], new_info],
+            ignore_index=True
+        )
+
+    new_info.to_csv(info_path, index=False, encoding="utf-8-sig")
+
+
+def main():
+    """Generate synthetic toads from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="Data directory to write the toads to.")
+    parser.add_argument(
+        "--toads", type=int, default=5, help="Number of toads to generate."
+    )
+    parser.add_argument(
+        "--hops", type=int, default=20, help="Number of hops of each toad."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Seed of the random generator, same seed same data."
+    )
+    parser.add_argument(
+        "--prefix", default="Synthetic",
+        help="Start of the toad names, followed by their number."
+    )
+    arguments = parser.parse_args()
+
+    os.makedirs(arguments.path, exist_ok=True)
+    toad_hop = generate_toads(
+        path=arguments.path,
+        num_toads=arguments.toads,
+        num_hops=arguments.hops,
+        seed=arguments.seed,
+        prefix=arguments.prefix
+    )
+    print(f"Generated {sum(len(hops) for hops in toad_hop.values())} hops of "
+          f"{len(toad_hop)} toads in {arguments.path}.")
+
+
+if __name__ == "__main__":
+    main()
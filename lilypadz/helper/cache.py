@@ -0,0 +1,132 @@
+"""This file holds the in-memory cache shared by the project."""
+
+from threading import Lock
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, NamedTuple
+
+# Marks a value that is not in the cache, since None may be cached.
+_MISSING = object()
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of a cache."""
+
+    hits: int
+    misses: int
+    entries: int
+    size: int
+    max_size: int
+
+
+class LRUCache:
+    """A thread safe cache that evicts the least recently used entries.
+
+    Every entry has a size given by ``size_of``, by default one per entry.
+    Entries are evicted once the total size grows over ``max_size``.
+    """
+
+    def __init__(self,
+                 max_size: int,
+                 size_of: Callable[[Any], int] = lambda value: 1):
+        """Set up an empty cache.
+
+        :param max_size: The largest total size the cache may hold.
+        :param size_of: A function that gives the size of a cached value.
+        """
+        self.max_size = max_size
+        self._size_of = size_of
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Get a cached value, compute and cache it when it is missing.
+
+        :param key: The key of the value.
+        :param compute: A function that computes the value.
+        :return: The cached value.
+        """
+        value = self.lookup(key=key, default=_MISSING)
+
+        # Compute outside of the lock so other keys are not blocked.
+        if value is _MISSING:
+            value = compute()
+            self.put(key=key, value=value)
+
+        return value
+
+    def lookup(self, key: Hashable, default: Any = None) -> Any:
+        """Get a cached value without computing it when it is missing.
+
+        :param key: The key of the value.
+        :param default: What to give when the value is missing.
+        :return: The cached value or the default.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            self._misses += 1
+
+        return default
+
+    def put(self, key: Hashable, value: Any):
+        """Cache a value and evict old entries if the cache is too large.
+
+        :param key: The key of the value.
+        :param value: The value to cache.
+        """
+        size = self._size_of(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+
+            # Values larger than the whole cache are not kept.
+            if size > self.max_size:
+                return
+
+            self._entries[key] = (value, size)
+            self._size += size
+            self._evict()
+
+    def resize(self, max_size: int):
+        """Change the largest total size the cache may hold.
+
+        :param max_size: The new largest total size.
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def discard(self, match: Callable[[Hashable], bool]):
+        """Remove every entry whose key matches.
+
+        :param match: A function that tells whether a key should be removed.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                self._size -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+
+    def info(self) -> CacheInfo:
+        """Get the statistics of the cache."""
+        with self._lock:
+            return CacheInfo(hits=self._hits, misses=self._misses,
+                             entries=len(self._entries), size=self._size,
+                             max_size=self.max_size)
+
+    def _evict(self):
+        """Drop the least recently used entries until the cache fits."""
+        while self._size > self.max_size:
+            self._size -= self._entries.popitem(last=False)[1][1]
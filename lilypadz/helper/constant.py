@@ -1,28 +1,87 @@
 """This file holds the necessary constants for the project."""
+import os
 import colorlover
 
-# Toad name and their corresponding hop numbers.
-TOAD_HOP = {
-    "Atlas": [
-        5, 8, 9, 13, 14, 18, 19, 20, 21, 25, 26, 36, 43, 44
-    ],
-    "Fortuna": [
-        2, 5, 7, 9, 11, 13, 14, 15, 16, 18, 20, 21, 23, 25, 26, 29, 31, 32,
-        37, 39, 40, 42, 43, 45, 53
-    ],
-    "Gelos": [
-        2, 3, 10, 11, 13, 14, 15, 16, 17, 18, 19, 22, 23, 26, 30, 32, 35, 37,
-        38, 39, 42, 43, 44, 45, 47, 48, 50
-    ],
-    "Talos": [
-        9, 15, 16, 17, 18, 20, 21, 24, 31, 32, 33, 38, 41, 42, 44, 45, 46, 50,
-        52, 53, 54
-    ],
-    "Zeus": [
-        1, 4, 5, 8, 11, 14, 16, 19, 20, 23, 28, 33, 35, 36, 38, 41, 42, 43, 44,
-        45, 46, 47, 48, 49
-    ]
-}
+# Location of the raw toad data, relative to the project root. Set
+# LILYPADZ_DATA_PATH to work on another data set, such as a generated one.
+DATA_PATH = os.environ.get("LILYPADZ_DATA_PATH", "lilypadz/data")
+
+# Location of the binary hop store built from the raw data.
+STORE_PATH = f"{DATA_PATH}/store"
+
+# Location of the index of the toads and hops found in the data.
+REGISTRY_PATH = f"{STORE_PATH}/registry.json"
+
+# Memory budget in bytes for the processed hop cache.
+HOP_CACHE_SIZE = 64 * 1024 ** 2
+
+# Number of clustering results to keep in memory.
+CLUSTERING_CACHE_SIZE = 128
+
+# Number of hops fitted at a time by the mini batch clustering.
+CLUSTERING_BATCH_SIZE = 4096
+
+# Number of K means fitted in parallel by a sweep, -1 for all cores.
+SWEEP_N_JOBS = -1
+
+# Pool that loads hops in parallel, "thread" or "process".
+HOP_LOADING_POOL = "thread"
+
+# Number of hops loaded in parallel, None for the number of cores.
+HOP_LOADING_WORKERS = None
+
+# Number of analysis jobs run in parallel, None for the number of cores.
+JOB_WORKERS = None
+
+# How job workers are started, "spawn" starts them clean since a forked
+# worker may copy a lock held by another thread of the app.
+JOB_START_METHOD = "spawn"
+
+# Python that starts the job workers, default to sys.executable unless the
+# app is embedded in a server such as mod_wsgi. Set LILYPADZ_JOB_PYTHON when
+# neither is the Python of the app.
+JOB_PYTHON = os.environ.get("LILYPADZ_JOB_PYTHON")
+
+# Number of jobs whose status and result are kept for polling.
+JOB_HISTORY_SIZE = 100
+
+# Whether to load every hop in the background when the app starts.
+WARM_UP_ON_START = True
+
+# Number of time points each hop is resampled to in the hop tensor.
+TENSOR_POINTS = 100
+
+# Number of most similar hops found by a similarity search.
+SIMILAR_HOPS = 10
+
+# Furthest number of time points that dynamic time warping may shift a hop.
+SIMILARITY_WINDOW = 10
+
+# Number of hops whose warping distance is computed at a time.
+SIMILARITY_BATCH_SIZE = 32
+
+# Whether to time the stages of a request and serve them at /metrics, set
+# LILYPADZ_METRICS=1 to turn it on.
+METRICS_ENABLED = os.environ.get("LILYPADZ_METRICS") == "1"
+
+# Upper bounds in seconds of the buckets of the stage timing histograms.
+METRICS_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10]
+
+# Smallest response in bytes that is worth compressing.
+COMPRESS_MIN_SIZE = 1024
+
+# Level of the gzip compression of the responses, from 1 to 9.
+COMPRESS_LEVEL = 6
+
+# Names of the processed kinematic variables.
+KINEMATIC_VARIABLES = [
+    "Elbow flexion/extension",
+    "Humeral protraction/retraction",
+    "Humeral depression/elevation"
+]
+
+# Names of the processed force plate variables.
+FORCE_PLATE_VARIABLES = ["Fore-Aft", "Lateral", "Normal"]
 
 # Toad name and their corresponding color scale.
 TOAD_COLOR = {
@@ -39,3 +98,6 @@ SIGHT_BLIND_COLOR = {
     "Blind": colorlover.scales["3"]["qual"]["Dark2"][1],
     "Unknown": colorlover.scales["3"]["qual"]["Dark2"][2]
 }
+
+# Percentiles that bound the band of an aggregated small series.
+BAND_PERCENTILES = [25, 75]
@@ -0,0 +1,161 @@
+"""This file times the stages of a request and reports them to Prometheus.
+
+A stage is timed by wrapping it in ``span``. The time of every span is
+counted in a histogram of its stage, which ``render_metrics`` writes in the
+Prometheus text format, along with the hit and miss counters of the caches
+it is given. When the metrics are turned off, ``span`` gives a shared
+context that does nothing, so the stages run at full speed.
+
+Each process counts its own spans, so the work done in the job and hop
+loading process pools is not included.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+from typing import ContextManager, Dict, List
+from lilypadz.helper.cache import CacheInfo
+from lilypadz.helper.constant import METRICS_BUCKETS, METRICS_ENABLED
+
+# Name of the histogram metric.
+METRIC_NAME = "lilypadz_stage_seconds"
+
+# Prefix of the cache metrics.
+CACHE_METRIC_NAME = "lilypadz_cache"
+
+# The context given by span when the metrics are turned off.
+_NO_SPAN = nullcontext()
+
+
+class Histogram:
+    """A thread safe count of durations in buckets, as Prometheus expects."""
+
+    def __init__(self, buckets: List[float]):
+        """Set up an empty histogram.
+
+        :param buckets: Upper bounds of the buckets in seconds, in order.
+        """
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        """Count one duration.
+
+        :param value: The duration in seconds.
+        """
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self, labels: str) -> List[str]:
+        """Write the cumulative buckets, sum and count of the histogram.
+
+        :param labels: The labels of the histogram, such as stage="read".
+        :return: The lines of the histogram in the Prometheus text format.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ["+Inf"], counts):
+            cumulative += count
+            lines.append(
+                f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            )
+
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total}")
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {cumulative}")
+
+        return lines
+
+
+# The histogram of each stage timed so far.
+_histogram_lock = Lock()
+_histograms: Dict[str, Histogram] = {}
+
+
+def get_histogram(stage: str) -> Histogram:
+    """Get the histogram of a stage, creating it the first time.
+
+    :param stage: The name of the stage.
+    """
+    with _histogram_lock:
+        if stage not in _histograms:
+            _histograms[stage] = Histogram(buckets=METRICS_BUCKETS)
+
+        return _histograms[stage]
+
+
+@contextmanager
+def _timed_span(stage: str):
+    """Count the time spent in the block in the histogram of a stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_histogram(stage=stage).observe(time.perf_counter() - start)
+
+
+def span(stage: str) -> ContextManager:
+    """Time the block it wraps as one run of a stage.
+
+    :param stage: The name of the stage.
+    :return: A context that times the block, or does nothing when the
+        metrics are turned off.
+    """
+    return _timed_span(stage=stage) if METRICS_ENABLED else _NO_SPAN
+
+
+def render_cache_info(cache_info: Dict[str, CacheInfo]) -> List[str]:
+    """Write the hit and miss counters and the size of some caches.
+
+    :param cache_info: The statistics of each cache, keyed by its name.
+    :return: The lines of the cache metrics in the Prometheus text format.
+    """
+    lines = []
+    for field, suffix, kind, description in [
+        ("hits", "hits_total", "counter", "Lookups answered by the cache."),
+        ("misses", "misses_total", "counter",
+         "Lookups the cache could not answer."),
+        ("entries", "entries", "gauge", "Values held by the cache."),
+        ("size", "size", "gauge",
+         "Total size of the values held by the cache."),
+        ("max_size", "max_size", "gauge",
+         "Largest total size the cache may hold.")
+    ]:
+        name = f"{CACHE_METRIC_NAME}_{suffix}"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for cache, info in sorted(cache_info.items()):
+            lines.append(f'{name}{{cache="{cache}"}} {getattr(info, field)}')
+
+    return lines
+
+
+def render_metrics(cache_info: Dict[str, CacheInfo] = None) -> str:
+    """Write the histogram of every stage in the Prometheus text format.
+
+    :param cache_info: The statistics of each cache to report, keyed by its
+        name, default to none.
+    """
+    with _histogram_lock:
+        histograms = sorted(_histograms.items())
+
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent in each stage of a request.",
+        f"# TYPE {METRIC_NAME} histogram"
+    ]
+    for stage, histogram in histograms:
+        lines.extend(histogram.render(labels=f'stage="{stage}"'))
+
+    if cache_info:
+        lines.extend(render_cache_info(cache_info=cache_info))
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,74 @@
+"""This file adds HTTP validators and compression to the responses."""
+
+import json
+import gzip
+import hashlib
+from functools import wraps
+from typing import Callable
+from flask import Response, make_response, request
+from lilypadz.helper.constant import COMPRESS_LEVEL, COMPRESS_MIN_SIZE
+from lilypadz.model.data_reader import get_dataset_version
+
+
+def get_request_etag() -> str:
+    """Get a tag of the data version, the path and the request options."""
+    options = request.get_json(silent=True)
+
+    # Key order does not change what is asked for.
+    body = json.dumps(options, sort_keys=True).encode() \
+        if options is not None else request.get_data()
+
+    return hashlib.sha1(
+        get_dataset_version().encode() + request.path.encode() + body
+    ).hexdigest()
+
+
+def conditional(view: Callable) -> Callable:
+    """Tag the responses of a view and answer 304 when the client has the
+    response with the same tag, without running the view.
+
+    :param view: A view whose response only depends on the data and the
+        request options.
+    :return: The wrapped view.
+    """
+    @wraps(view)
+    def conditional_view(*args, **kwargs):
+        etag = get_request_etag()
+
+        # The tag is weak, the body may be compressed differently.
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        return response
+
+    return conditional_view
+
+
+def compress_response(response: Response) -> Response:
+    """Compress a large response with gzip when the client accepts it.
+
+    :param response: The response about to be sent.
+    :return: The same response, compressed if worth it.
+    """
+    if response.status_code != 200 or response.direct_passthrough or \
+            "Content-Encoding" in response.headers:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    # The body now depends on the encodings the client accepts.
+    response.vary.add("Accept-Encoding")
+    if "gzip" not in request.accept_encodings:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+
+    return response
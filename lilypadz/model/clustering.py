@@ -1,56 +1,119 @@
 import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
-from typing import List
+from typing import List, NamedTuple, Tuple
 from flask import jsonify
+from joblib import Parallel, delayed
 from plotly.offline import plot
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from lilypadz.model.data_processor import get_toad_processed_hop
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.metrics import silhouette_score
+from threadpoolctl import threadpool_limits
+from lilypadz.helper.cache import LRUCache
+from lilypadz.helper.constant import CLUSTERING_CACHE_SIZE, \
+    CLUSTERING_BATCH_SIZE, SWEEP_N_JOBS
+from lilypadz.helper.metrics import span
+from lilypadz.model.feature_index import get_features
+from lilypadz.model.hop_tensor import get_hop_tensor
 
 
-def get_all_clustering_result(n_clusters: int,
-                              names: List[str],
-                              variable: List[str]):
-    """Generate a 3D plot that contains just the dots for K means result.
+class ClusteringResult(NamedTuple):
+    """Data structure of one K means result and its rendered output."""
 
-    :return: A plotly object hat has been converted to HTML format string.
+    reduced_data: np.ndarray
+    k_means_index: np.ndarray
+    labels: np.ndarray
+    table: str
+    plot: str
+
+
+# Clustering results keyed by the request parameters and the data version.
+CLUSTERING_CACHE = LRUCache(max_size=CLUSTERING_CACHE_SIZE)
+
+
+def fit_full_batch(data: pd.DataFrame,
+                   n_clusters: int,
+                   random_state: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce the data with PCA and cluster it with K means at once.
+
+    :param data: The features of each hop.
+    :param n_clusters: Number of clusters to find.
+    :param random_state: Seed of PCA and K means.
+    :return: The reduced data and the cluster of each hop.
+    """
+    k_means = KMeans(n_clusters=n_clusters, random_state=random_state)
+    reduced_data = PCA(
+        n_components=3, random_state=random_state
+    ).fit_transform(data)
+
+    return reduced_data, k_means.fit_predict(reduced_data)
+
+
+def fit_mini_batch(data: pd.DataFrame,
+                   n_clusters: int,
+                   random_state: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce the data with incremental PCA and cluster it with mini batch K
+    means, so that only one batch of hops is worked on at a time.
+
+    Only the fits work in batches. The features of every hop are built
+    before, and the reduced data and clusters of every hop are returned, so
+    memory still grows with the number of hops, by a few numbers per hop.
+
+    :param data: The features of each hop.
+    :param n_clusters: Number of clusters to find.
+    :param random_state: Seed of K means.
+    :return: The reduced data and the cluster of each hop.
     """
-    # Get the force plate column names.
-    fp_variables = list(
-        {"Fore-Aft", "Lateral", "Normal"}.intersection(variable)
+    # Split into batches of at least the batch size, so that every batch has
+    # enough hops for the three components.
+    batches = np.array_split(
+        data.to_numpy(), max(1, len(data.index) // CLUSTERING_BATCH_SIZE)
     )
 
-    # Get the kinematic column names.
-    kinematic_variables = list(
-        {"Elbow flexion/extension",
-         "Humeral protraction/retraction",
-         "Humeral depression/elevation"}.intersection(variable)
+    pca = IncrementalPCA(n_components=3)
+    for batch in batches:
+        pca.partial_fit(batch)
+    reduced_data = np.concatenate([pca.transform(batch) for batch in batches])
+
+    k_means = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=CLUSTERING_BATCH_SIZE,
+        random_state=random_state
     )
 
-    # Get desired toad data.
-    toads_hop = [
-        get_toad_processed_hop(name=name) for name in names
-    ]
+    return reduced_data, k_means.fit_predict(reduced_data)
 
-    # Get all data.
-    all_data = [
-        [f"{data_name} {data.sight}"] +
-        list(data.kinematic[kinematic_variables].mean(axis="index")) +
-        list(data.force_plate[fp_variables].mean(axis="index"))
-        for one_toad_hop in toads_hop
-        for data_name, data in one_toad_hop.items()
-    ]
 
-    data = pd.DataFrame(
-        index=[data[0] for data in all_data],
-        data=[data[1:] for data in all_data]
-    ).dropna(axis="index")
+# Ways to fit the clustering, selectable by the request.
+CLUSTERING_METHODS = {
+    "full": fit_full_batch,
+    "mini_batch": fit_mini_batch
+}
+
+
+def compute_clustering_result(n_clusters: int,
+                              names: List[str],
+                              variable: List[str],
+                              random_state: int = 0,
+                              method: str = "full") -> ClusteringResult:
+    """Run PCA and K means on the mean features of the desired toads.
+
+    :param n_clusters: Number of clusters to find.
+    :param names: Names of the desired toads.
+    :param variable: Variable of interest.
+    :param random_state: Seed of PCA and K means, same seed same result.
+    :param method: How to fit, one of CLUSTERING_METHODS.
+    :return: The reduced data, cluster of each hop, and rendered plot/table.
+    """
+    # Get the mean of each variable for every hop of the desired toads.
+    with span("features"):
+        data = get_features(names=names, variable=variable)
 
     # Get kMeans analyze result and unpack it.
-    k_means = KMeans(n_clusters=n_clusters)
-    reduced_data = PCA(n_components=3).fit_transform(data)
-    k_means_index = k_means.fit_predict(reduced_data)
+    with span("pca_kmeans"):
+        reduced_data, k_means_index = CLUSTERING_METHODS[method](
+            data=data, n_clusters=n_clusters, random_state=random_state
+        )
 
     # Get hop names.
     labels = data.index.values
@@ -102,134 +165,170 @@ def get_all_clustering_result(n_clusters: int,
         )
     )
 
-    table = pd.DataFrame(data={
-        "Cluster #": [index + 1 for index in k_means_index],
-        "Document": labels,
-        "X-Coordinate": reduced_data[:, 0],
-        "Y-Coordinate": reduced_data[:, 1],
-        "Z-Coordinate": reduced_data[:, 2]
-    }).to_html(
-        index=False,
-        classes="table table-striped table-bordered text-center"
-    )
-
-    # Return the plotly figure and table.
-    return jsonify(
-        table=table,
-        plot=plot(
+    with span("cluster_render"):
+        table = pd.DataFrame(data={
+            "Cluster #": [index + 1 for index in k_means_index],
+            "Document": labels,
+            "X-Coordinate": reduced_data[:, 0],
+            "Y-Coordinate": reduced_data[:, 1],
+            "Z-Coordinate": reduced_data[:, 2]
+        }).to_html(
+            index=False,
+            classes="table table-striped table-bordered text-center"
+        )
+        cluster_plot = plot(
             go.Figure(data=data, layout=layout),
             show_link=False,
             output_type="div",
             include_plotlyjs=False
         )
+
+    return ClusteringResult(
+        reduced_data=reduced_data,
+        k_means_index=k_means_index,
+        labels=labels,
+        table=table,
+        plot=cluster_plot
+    )
+
+
+def get_clustering_result(n_clusters: int,
+                          names: List[str],
+                          variable: List[str],
+                          random_state: int = 0,
+                          method: str = "full") -> ClusteringResult:
+    """Get the K means result, reusing it for identical requests.
+
+    :param n_clusters: Number of clusters to find.
+    :param names: Names of the desired toads.
+    :param variable: Variable of interest.
+    :param random_state: Seed of PCA and K means.
+    :param method: How to fit, one of CLUSTERING_METHODS.
+    :return: The reduced data, cluster of each hop, and rendered plot/table.
+    """
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"Unknown clustering method {method}.")
+
+    return CLUSTERING_CACHE.get(
+        key=(
+            tuple(names), frozenset(variable), n_clusters, random_state,
+            method, get_hop_tensor().get_version(names=names)
+        ),
+        compute=lambda: compute_clustering_result(
+            n_clusters=n_clusters,
+            names=names,
+            variable=variable,
+            random_state=random_state,
+            method=method
+        )
     )
 
 
+def get_all_clustering_result(n_clusters: int,
+                              names: List[str],
+                              variable: List[str],
+                              random_state: int = 0,
+                              method: str = "full"):
+    """Generate a 3D plot that contains just the dots for K means result.
+
+    :return: A plotly object hat has been converted to HTML format string.
+    """
+    result = get_clustering_result(
+        n_clusters=n_clusters,
+        names=names,
+        variable=variable,
+        random_state=random_state,
+        method=method
+    )
+
+    # Return the plotly figure and table.
+    return jsonify(table=result.table, plot=result.plot)
+
+
 def get_one_clustering_result(n_clusters: int,
                               name: str,
-                              variable: List[str]):
+                              variable: List[str],
+                              random_state: int = 0,
+                              method: str = "full"):
     """Generate a 3D plot that contains just the dots for K means result.
 
     :return: A plotly object hat has been converted to HTML format string.
     """
-    # Get the force plate column names.
-    fp_variables = list(
-        {"Fore-Aft", "Lateral", "Normal"}.intersection(variable)
+    return get_all_clustering_result(
+        n_clusters=n_clusters,
+        names=[name],
+        variable=variable,
+        random_state=random_state,
+        method=method
     )
 
-    # Get the kinematic column names.
-    kinematic_variables = list(
-        {"Elbow flexion/extension",
-         "Humeral protraction/retraction",
-         "Humeral depression/elevation"}.intersection(variable)
-    )
 
-    # Get all data.
-    all_data = [
-        [f"{data_name} {data.sight}"] +
-        list(data.kinematic[kinematic_variables].mean(axis="index")) +
-        list(data.force_plate[fp_variables].mean(axis="index"))
-        for data_name, data in get_toad_processed_hop(name=name).items()
-    ]
+def _fit_one_k(reduced_data: np.ndarray,
+               n_clusters: int,
+               random_state: int) -> dict:
+    """Fit K means with one number of clusters and score it.
 
-    data = pd.DataFrame(
-        index=[data[0] for data in all_data],
-        data=[data[1:] for data in all_data]
-    ).dropna(axis="index")
+    :param reduced_data: The PCA projection of the features.
+    :param n_clusters: Number of clusters to find.
+    :param random_state: Seed of K means.
+    :return: The inertia, silhouette score and cluster of each hop.
+    """
+    # The sweep already fits one model per core, so each fit keeps to one
+    # thread instead of starting its own threads on every core.
+    with threadpool_limits(limits=1, user_api="openmp"):
+        k_means = KMeans(n_clusters=n_clusters, random_state=random_state)
+        k_means_index = k_means.fit_predict(reduced_data)
 
-    # Get kMeans analyze result and unpack it.
-    k_means = KMeans(n_clusters=n_clusters)
-    reduced_data = PCA(n_components=3).fit_transform(data)
-    k_means_index = k_means.fit_predict(reduced_data)
+    # The silhouette score needs at least two clusters and a hop to spare.
+    has_silhouette = 1 < len(np.unique(k_means_index)) < len(reduced_data)
 
-    # Get hop names.
-    labels = data.index.values
+    return dict(
+        k=n_clusters,
+        inertia=float(k_means.inertia_),
+        silhouette=float(
+            silhouette_score(reduced_data, k_means_index)
+        ) if has_silhouette else None,
+        cluster=[int(index) + 1 for index in k_means_index]
+    )
 
-    # Separate x, y, z coordinates from the reduced data set.
-    x_value = reduced_data[:, 0]
-    y_value = reduced_data[:, 1]
-    z_value = reduced_data[:, 2]
 
-    # Create plot for each cluster so the color will differ among clusters.
-    data = [
-        go.Scatter3d(
-            x=x_value[np.where(group_number == k_means_index)],
-            y=y_value[np.where(group_number == k_means_index)],
-            z=z_value[np.where(group_number == k_means_index)],
-            text=labels[np.where(group_number == k_means_index)],
-            mode="markers",
-            name=f"Cluster {group_number + 1}",
-            hoverinfo="text",
-            marker=dict(
-                size=12,
-                line=dict(width=1)
-            )
-        )
-        for group_number in np.unique(k_means_index)
-    ]
+def get_clustering_sweep(names: List[str],
+                         variable: List[str],
+                         k_min: int,
+                         k_max: int,
+                         random_state: int = 0):
+    """Fit K means for a range of cluster numbers on one PCA projection.
 
-    # Set the layout of the plot, mainly set the background color to grey.
-    layout = go.Layout(
-        height=500,
-        hovermode="closest",
-        title="K-Means Two Dimensional Scatter Plot",
-        scene=dict(
-            xaxis=dict(
-                title="PC1",
-                showline=False,
-                showbackground=True,
-                backgroundcolor="rgb(230,230,230)"),
-            yaxis=dict(
-                title="PC2",
-                showline=False,
-                showbackground=True,
-                backgroundcolor="rgb(230,230,230)"),
-            zaxis=dict(
-                title="PC3",
-                showline=False,
-                showbackground=True,
-                backgroundcolor="rgb(230,230,230)"),
+    :param names: Names of the desired toads.
+    :param variable: Variable of interest.
+    :param k_min: The smallest number of clusters to try.
+    :param k_max: The largest number of clusters to try.
+    :param random_state: Seed of PCA and K means.
+    :return: The inertia, silhouette score and clusters for each number of
+        clusters, with the hop names they refer to.
+    """
+    if not 1 <= k_min <= k_max:
+        raise ValueError(
+            "The smallest number of clusters must be at least 1 and at most "
+            "the largest."
         )
-    )
 
-    table = pd.DataFrame(data={
-        "Cluster #": [index + 1 for index in k_means_index],
-        "Document": labels,
-        "X-Coordinate": reduced_data[:, 0],
-        "Y-Coordinate": reduced_data[:, 1],
-        "Z-Coordinate": reduced_data[:, 2]
-    }).to_html(
-        index=False,
-        classes="table table-striped table-bordered text-center"
-    )
+    # Get the mean of each variable for every hop of the desired toads.
+    data = get_features(names=names, variable=variable)
 
-    # Return the plotly figure and table.
-    return jsonify(
-        table=table,
-        plot=plot(
-            go.Figure(data=data, layout=layout),
-            show_link=False,
-            output_type="div",
-            include_plotlyjs=False
+    # Project once and share the projection among all the fits.
+    reduced_data = PCA(
+        n_components=3, random_state=random_state
+    ).fit_transform(data)
+
+    # K means releases the GIL, so threads fit the models in parallel.
+    sweep = Parallel(n_jobs=SWEEP_N_JOBS, prefer="threads")(
+        delayed(_fit_one_k)(
+            reduced_data=reduced_data,
+            n_clusters=n_clusters,
+            random_state=random_state
         )
+        for n_clusters in range(k_min, min(k_max, len(data.index)) + 1)
     )
+
+    return jsonify(labels=data.index.tolist(), sweep=sweep)
@@ -1,8 +1,20 @@
+import numpy as np
 import pandas as pd
+import multiprocessing
+from functools import partial
+from threading import Lock
 from sklearn import preprocessing
-from typing import NamedTuple, Dict
-from lilypadz.helper.constant import TOAD_HOP
-from lilypadz.model.data_reader import get_one_hop
+from typing import NamedTuple, Dict, List, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from lilypadz.helper.cache import CacheInfo, LRUCache
+from lilypadz.helper.constant import HOP_CACHE_SIZE, HOP_LOADING_POOL, \
+    HOP_LOADING_WORKERS, JOB_START_METHOD
+from lilypadz.helper.metrics import span
+from lilypadz.model.data_reader import HopData, get_one_hop, \
+    get_hop_stamp, get_all_hop
+from lilypadz.model.hop_metadata import get_metadata_index
+from lilypadz.model.registry import get_registered_toad_hop
 
 
 class ProcessedHop(NamedTuple):
@@ -13,6 +25,106 @@ class ProcessedHop(NamedTuple):
     sight: str
 
 
+def find_fp_start(normal_force: np.ndarray,
+                  lengths: np.ndarray = None) -> np.ndarray:
+    """Find where the normal force begins to increase.
+
+    The start is the first sample that is higher than the previous one and is
+    followed by an increase of more than 1 over the next nine samples. When
+    no sample qualifies the start is 100, or 0 for traces shorter than two.
+
+    :param normal_force: One force trace, or a stack of traces padded at the
+        end with NaN.
+    :param lengths: The number of samples in each trace, default to the width
+        of the stack.
+    :return: The start of each trace, a single value for one trace.
+    """
+    force = np.atleast_2d(np.asarray(normal_force, dtype=np.float64))
+    num_trace, width = force.shape
+    lengths = np.full(num_trace, width) if lengths is None else \
+        np.asarray(lengths)
+
+    # Change of the force from the previous sample, none for the first one.
+    change = np.full_like(force, np.nan)
+    change[:, 1:] = np.diff(force, axis=1)
+
+    # Total change over the next nine samples, summed in sample order.
+    total_change = np.zeros_like(force)
+    for step in range(1, min(width, 10)):
+        total_change[:, :width - step] += change[:, step:]
+
+    # Only samples with ten more samples after them may be the start.
+    is_start = (change > 0) & (total_change > 1) & \
+        (np.arange(width) + 10 < lengths[:, np.newaxis])
+
+    # Empty stacks have no sample to look at.
+    first_start = is_start.argmax(axis=1) if width > 0 else \
+        np.zeros(num_trace, dtype=int)
+
+    fp_start = np.where(
+        is_start.any(axis=1), first_start, np.where(lengths > 1, 100, 0)
+    )
+
+    return fp_start[0] if np.ndim(normal_force) == 1 else fp_start
+
+
+def stack_traces(
+        traces: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack traces of different lengths, padding the end with NaN.
+
+    :param traces: The traces to stack.
+    :return: The stacked traces and the length of each trace.
+    """
+    lengths = np.array([len(trace) for trace in traces], dtype=int)
+    stacked = np.full((len(traces), lengths.max(initial=0)), np.nan)
+
+    for index, trace in enumerate(traces):
+        stacked[index, :lengths[index]] = trace
+
+    return stacked, lengths
+
+
+def get_all_fp_start() -> Dict[str, Dict[int, int]]:
+    """Find where the normal force begins to increase for all hops at once.
+
+    :return: A dictionary where the key is toad and the item is a dictionary
+        of the force plate start of each hop.
+    """
+    all_hop = get_all_hop()
+    hop_keys = [
+        (toad, hop) for toad, toad_hop in all_hop.items() for hop in toad_hop
+    ]
+
+    # Find the start of every stacked normal force trace in one call.
+    fp_start = find_fp_start(*stack_traces([
+        all_hop[toad][hop].force.iloc[:, 2].to_numpy()
+        for toad, hop in hop_keys
+    ]))
+
+    result = {toad: {} for toad in all_hop}
+    for (toad, hop), start in zip(hop_keys, fp_start):
+        result[toad][hop] = int(start)
+
+    return result
+
+
+def get_processed_hop_size(processed_hop: ProcessedHop) -> int:
+    """Get the number of bytes used by one processed hop.
+
+    :param processed_hop: The processed hop of interest.
+    """
+    return int(
+        processed_hop.kinematic.memory_usage(deep=True).sum() +
+        processed_hop.force_plate.memory_usage(deep=True).sum()
+    )
+
+
+# Processed hops shared by every request, keyed by toad, hop and file stamps.
+PROCESSED_HOP_CACHE = LRUCache(
+    max_size=HOP_CACHE_SIZE, size_of=get_processed_hop_size
+)
+
+
 def get_one_processed_hop(name: str, hop: int) -> ProcessedHop:
     """Get processed data for one hop of a specific toad.
 
@@ -22,22 +134,30 @@ def get_one_processed_hop(name: str, hop: int) -> ProcessedHop:
     """
 
     # Get the hop data from the desired toad.
-    global increasing
     hop_data = get_one_hop(name=name, hop=hop)
+    metadata = get_metadata_index()
 
     # Get sighted or blinded for the input toad.
-    sightedness = hop_data.all_hop_info[
-        (hop_data.all_hop_info["ID"] == name) &
-        (hop_data.all_hop_info["Hop Number"] == hop) &
-        (hop_data.all_hop_info["Hop Phase"] == "Landing")]["Sight"]
+    landing_info = metadata.info.get((name, hop, "Landing"))
+    sight = landing_info["Sight"] if landing_info is not None else "Unknown"
+
+    return process_hop(
+        hop_data=hop_data, timing=metadata.timing[(name, hop)], sight=sight
+    )
+
 
-    sight = sightedness.iloc[0] if not sightedness.empty else "Unknown"
+def process_hop(hop_data: HopData, timing: dict, sight: str) -> ProcessedHop:
+    """Process the data of one hop.
 
+    :param hop_data: The xyz, angle and force data of the hop.
+    :param timing: The row of the hop in the time data of its toad.
+    :param sight: Whether the toad was "Sighted" or "Blind" for the hop.
+    :return: Desired kinematic and force plate data.
+    """
     # Extract and round the time data.
-    time = hop_data.time
-    onset = round(time.loc[time['Hop'] == hop]['Onset'].iloc[0])
-    recovery = round(time.loc[time['Hop'] == hop]['Recovery'].iloc[0])
-    first_touch = round(time.loc[time['Hop'] == hop]['First Touch'].iloc[0])
+    onset = round(timing["Onset"])
+    recovery = round(timing["Recovery"])
+    first_touch = round(timing["First Touch"])
 
     # Extract the kinematic data.
     hop_kinematic_data = hop_data.angle
@@ -73,38 +193,8 @@ def get_one_processed_hop(name: str, hop: int) -> ProcessedHop:
     hop_fp_data = hop_data.force
 
     # Find where normal force (col 3) data begins to increase
-    normal_df = hop_fp_data.iloc[:, 2]
-
-    # Get the size of the DataFrame.
-    index = 1
-    fp_start = 0
-    increasing = False
-    frame_size = len(hop_fp_data.index)
-
-    while index < frame_size:
-        if (normal_df.iloc[index] - normal_df.iloc[index - 1]) > 0:
-            # if it increases for one check if it increases for next 10.
-            total_increase = 0
-            if index + 10 < frame_size:
-                for i in range(1, 10):
-                    total_increase = \
-                        total_increase + \
-                        (normal_df.iloc[index + i] -
-                         normal_df.iloc[index + i - 1])
-                    if total_increase > 1:
-                        increasing = True
-                    else:
-                        increasing = False
-                if increasing:
-                    fp_start = index
-                    # Stop the loop.
-                    index = frame_size
-            else:
-                fp_start = 100
-        else:
-            fp_start = 100
-
-        index = index + 1
+    with span("onset_detection"):
+        fp_start = int(find_fp_start(normal_force=hop_fp_data.iloc[:, 2]))
 
     # Select data from landing to recovery
     hop_fp_data = hop_fp_data.loc[fp_start - 10: fp_start + 50]
@@ -114,7 +204,8 @@ def get_one_processed_hop(name: str, hop: int) -> ProcessedHop:
 
     # Normalize each column in fp data
     scalar = preprocessing.StandardScaler()
-    scaled_fp_data = scalar.fit_transform(processed_fp_data)
+    with span("standard_scaler"):
+        scaled_fp_data = scalar.fit_transform(processed_fp_data)
     processed_fp_data = pd.DataFrame(
         scaled_fp_data,
         columns=["Fore-Aft", "Lateral", "Normal"]
@@ -128,21 +219,108 @@ def get_one_processed_hop(name: str, hop: int) -> ProcessedHop:
     )
 
 
+def get_processed_hop_cache_info() -> CacheInfo:
+    """Get the hit, miss and size statistics of the processed hop cache."""
+    return PROCESSED_HOP_CACHE.info()
+
+
+# Kinds of pools that can load hops in parallel, the processes are started
+# the same way as the job workers, as the app runs many threads.
+HOP_LOADING_POOLS = {
+    "thread": ThreadPoolExecutor,
+    "process": partial(
+        ProcessPoolExecutor,
+        mp_context=multiprocessing.get_context(JOB_START_METHOD)
+    )
+}
+
+# The pool shared by every request, its workers start on first use.
+_hop_loading_lock = Lock()
+_hop_loading_executor: Executor = HOP_LOADING_POOLS[HOP_LOADING_POOL](
+    max_workers=HOP_LOADING_WORKERS
+)
+
+
+def set_hop_loading_pool(pool: str = HOP_LOADING_POOL,
+                         workers: int = HOP_LOADING_WORKERS):
+    """Change the pool that loads hops in parallel.
+
+    :param pool: The kind of pool, one of HOP_LOADING_POOLS.
+    :param workers: Number of hops loaded in parallel, None for the number of
+        cores and 1 to load them one after another in the calling thread.
+    """
+    global _hop_loading_executor
+
+    if pool not in HOP_LOADING_POOLS:
+        raise ValueError(f"Unknown hop loading pool {pool}.")
+
+    with _hop_loading_lock:
+        old_executor = _hop_loading_executor
+        _hop_loading_executor = None if workers == 1 else \
+            HOP_LOADING_POOLS[pool](max_workers=workers)
+
+    # Hops being loaded by the old pool are left to finish.
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+
+
+def get_processed_hops(
+        name_hops: List[Tuple[str, int]]) -> List[ProcessedHop]:
+    """Get processed data for many hops, loading the missing ones in parallel.
+
+    :param name_hops: The toad and hop number of each hop of interest.
+    :return: The processed data of each hop, in the same order.
+    """
+    keys = [
+        (name, hop, get_hop_stamp(name=name, hop=hop))
+        for name, hop in name_hops
+    ]
+    processed_hops = {
+        key: PROCESSED_HOP_CACHE.lookup(key=key) for key in keys
+    }
+    missing = [key for key, value in processed_hops.items() if value is None]
+
+    names = [name for name, _, _ in missing]
+    hops = [hop for _, hop, _ in missing]
+
+    # A single hop is not worth a trip to the pool.
+    executor = _hop_loading_executor
+    if executor is None or len(missing) < 2:
+        loaded = map(get_one_processed_hop, names, hops)
+    else:
+        loaded = executor.map(get_one_processed_hop, names, hops)
+
+    # Results come back in the order they were asked for.
+    for key, processed_hop in zip(missing, loaded):
+        PROCESSED_HOP_CACHE.put(key=key, value=processed_hop)
+        processed_hops[key] = processed_hop
+
+    return [processed_hops[key] for key in keys]
+
+
+def get_toads_processed_hop(
+        names: List[str]) -> Dict[str, Dict[str, ProcessedHop]]:
+    """Get all processed hop data from some toads, loaded in parallel.
+
+    :param names: The toads of interest.
+    :return: A dictionary where the key is toad and the item is a dictionary
+        where the key is hop name and the item is data.
+    """
+    toad_hop = get_registered_toad_hop()
+    name_hops = [(name, hop) for name in names for hop in toad_hop[name]]
+    processed_hops = get_processed_hops(name_hops=name_hops)
+
+    result = {name: {} for name in names}
+    for (name, hop), processed_hop in zip(name_hops, processed_hops):
+        result[name][f"{name} hop {hop}"] = processed_hop
+
+    return result
+
+
 def get_toad_processed_hop(name: str) -> Dict[str, ProcessedHop]:
     """Get all processed hop data from one specific toad.
 
     :param name: The toad of interest.
     :return: A dictionary where the key is hop number and the item is data.
     """
-    return {
-        f"{name} hop {hop}": get_one_processed_hop(name=name, hop=hop)
-        for hop in TOAD_HOP[name]
-    }
-
-
-def get_all_processed_hop() -> Dict[str, Dict[str, ProcessedHop]]:
-    """Get all processed hop data from all toads."""
-    return {
-        toad: get_toad_processed_hop(name=toad)
-        for toad in TOAD_HOP.keys()
-    }
+    return get_toads_processed_hop(names=[name])[name]
@@ -1,18 +1,22 @@
 """This file helps reading in the data."""
 
+import os
+import hashlib
 import pandas as pd
-from typing import Dict, List, NamedTuple
-from lilypadz.helper.constant import TOAD_HOP
+from typing import Dict, List, NamedTuple, Tuple
+from lilypadz.helper.constant import DATA_PATH, STORE_PATH
+from lilypadz.helper.metrics import span
+from lilypadz.model.data_store import HOP_TABLES, get_store_index, \
+    has_stored_hop, is_fresh, load_hop, load_time, load_all_hop_info
+from lilypadz.model.registry import get_registered_toad_hop
 
 
 class HopData(NamedTuple):
     """Data structure of one hop of a specific toad."""
 
     xyz: pd.DataFrame
-    time: pd.DataFrame
     angle: pd.DataFrame
     force: pd.DataFrame
-    all_hop_info: pd.DataFrame
 
 
 def get_one_hop(name: str, hop: int) -> HopData:
@@ -20,26 +24,166 @@ def get_one_hop(name: str, hop: int) -> HopData:
 
     :param name: The toad of interest.
     :param hop: The hop number of interest.
-    :return: Desired hop data contains xyz data, force data and a time value.
+    :return: Desired hop data contains xyz, angle and force data.
+    """
+    # Prefer the binary hop store when it holds the hop.
+    if has_stored_hop(name=name, hop=hop):
+        with span("read_store"):
+            return get_one_stored_hop(name=name, hop=hop)
+
+    with span("read_csv"):
+        return get_one_csv_hop(name=name, hop=hop)
+
+
+def get_one_stored_hop(name: str, hop: int) -> HopData:
+    """Get data for one hop of a specific toad from the binary hop store.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :return: Desired hop data contains xyz, angle and force data.
+    """
+    hop_frames = load_hop(name=name, hop=hop)
+
+    return HopData(xyz=hop_frames["xyz"], angle=hop_frames["angle"],
+                   force=hop_frames["force"])
+
+
+def get_one_csv_hop(name: str, hop: int) -> HopData:
+    """Get data for one hop of a specific toad from the raw CSV files.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :return: Desired hop data contains xyz, angle and force data.
     """
     # Read in the xyz data.
-    xyz_frame = pd.read_csv(f"lilypadz/data/{name}/{hop}/xyz.csv")
+    xyz_frame = pd.read_csv(f"{DATA_PATH}/{name}/{hop}/xyz.csv")
 
     # Read in the angle data time.
-    angle_frame = pd.read_csv(f"lilypadz/data/{name}/{hop}/angle.csv")
+    angle_frame = pd.read_csv(f"{DATA_PATH}/{name}/{hop}/angle.csv")
 
     # Read in the force plate data.
-    force_frame = pd.read_csv(f"lilypadz/data/{name}/{hop}/force.csv")
+    force_frame = pd.read_csv(f"{DATA_PATH}/{name}/{hop}/force.csv")
 
-    # Read in the time data.
-    time_frame = pd.read_csv(f"lilypadz/data/{name}/time.csv")
+    # Pack all information and return the NamedTuple.
+    return HopData(xyz=xyz_frame, angle=angle_frame, force=force_frame)
 
-    # Read in all hopping info
-    all_hop_info_frame = pd.read_csv(f"lilypadz/data/All Hopping Info.csv")
 
-    # Pack all information and return the NamedTuple.
-    return HopData(xyz=xyz_frame, angle=angle_frame, force=force_frame,
-                   time=time_frame, all_hop_info=all_hop_info_frame)
+def get_table_stamp(name: str, hop: int) -> Tuple[int, ...]:
+    """Get the modification stamps of the tables of one hop, from wherever
+    they are read.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :return: The modification time in nanoseconds of each table file.
+    """
+    if has_stored_hop(name=name, hop=hop):
+        paths = [
+            f"{STORE_PATH}/{name}/{hop}/{table}.npy" for table in HOP_TABLES
+        ]
+    else:
+        paths = [
+            f"{DATA_PATH}/{name}/{hop}/{table}.csv" for table in HOP_TABLES
+        ]
+
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+def get_hop_stamp(name: str, hop: int) -> Tuple[int, ...]:
+    """Get the modification stamps of the source files of one hop, which are
+    its tables and the metadata of its toad.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :return: The modification time in nanoseconds of each source file.
+    """
+    return get_table_stamp(name=name, hop=hop) + \
+        get_metadata_stamp(names=[name])
+
+
+def get_all_hop_stamp() -> Tuple[Tuple[str, int, Tuple[int, ...]], ...]:
+    """Get the modification stamps of the source files of every hop.
+
+    :return: The toad, hop number and file stamps of each hop.
+    """
+    stamps = []
+    for name, hops in get_registered_toad_hop().items():
+        # The hops of a toad share its metadata.
+        metadata_stamp = get_metadata_stamp(names=[name])
+        stamps.extend(
+            (name, hop, get_table_stamp(name=name, hop=hop) + metadata_stamp)
+            for hop in hops
+        )
+
+    return tuple(stamps)
+
+
+def get_dataset_version() -> str:
+    """Get a hash of the stamps of every hop and of the hop metadata, which
+    changes whenever the data does."""
+    stamp = (
+        get_all_hop_stamp(),
+        get_metadata_stamp(names=list(get_registered_toad_hop().keys()))
+    )
+
+    return hashlib.sha1(repr(stamp).encode()).hexdigest()
+
+
+def get_time(name: str) -> pd.DataFrame:
+    """Get the time data of a specific toad, from the store if it is there
+    and time.csv did not change since.
+
+    :param name: The toad of interest.
+    """
+    path = f"{DATA_PATH}/{name}/time.csv"
+    layout = get_store_index()["time"].get(name)
+
+    if layout is not None and is_fresh(layout=layout, path=path):
+        return load_time(name=name)
+
+    return pd.read_csv(path)
+
+
+def get_all_hop_info() -> pd.DataFrame:
+    """Get all hopping info, from the store if it is built and All Hopping
+    Info.csv did not change since."""
+    path = f"{DATA_PATH}/All Hopping Info.csv"
+    index = get_store_index()
+
+    if index["hops"] and is_fresh(layout=index.get("info", {}), path=path):
+        return load_all_hop_info()
+
+    return pd.read_csv(path)
+
+
+def _get_mtime(path: str) -> int:
+    """Get the modification time in nanoseconds of a file, None if it is gone.
+
+    :param path: The file of interest.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_metadata_stamp(names: List[str]) -> Tuple[int, ...]:
+    """Get the modification stamps of the hop metadata files.
+
+    Both the CSV files and their copies in the store are stamped, since the
+    copies are only read while the CSV files are unchanged.
+
+    :param names: The toads whose time data is of interest.
+    :return: The modification time in nanoseconds of all hopping info and
+        the time data of each toad, None for the files that are not there.
+    """
+    return tuple(
+        _get_mtime(path) for path in
+        [f"{DATA_PATH}/All Hopping Info.csv",
+         f"{STORE_PATH}/all_hop_info.pkl"] +
+        [path for name in names
+         for path in (f"{DATA_PATH}/{name}/time.csv",
+                      f"{STORE_PATH}/{name}/time.npy")]
+    )
 
 
 def get_toad_hop(name: str, hops: List[int]) -> Dict[str, HopData]:
@@ -56,5 +200,5 @@ def get_all_hop() -> Dict[str, Dict[str, HopData]]:
     """Get all hop data from all toads."""
     return {
         toad: get_toad_hop(name=toad, hops=hops)
-        for toad, hops in TOAD_HOP.items()
+        for toad, hops in get_registered_toad_hop().items()
     }
@@ -0,0 +1,367 @@
+"""This file builds and reads the binary hop store.
+
+The store keeps every table of the raw CSV data as a ``.npy`` file, so that a
+hop can be loaded as memory-mapped slices instead of being parsed from text.
+Build it once by running ``python -m lilypadz.model.data_store`` from the
+project root. The index records the size and modification stamp of the CSV
+file each table was built from, so a table whose CSV file changed afterwards
+is read from the CSV file again until the store is rebuilt.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from threading import Lock
+from functools import lru_cache
+from typing import Dict, List
+from lilypadz.helper.constant import DATA_PATH, STORE_PATH
+
+# Tables stored for every hop.
+HOP_TABLES = ["xyz", "angle", "force"]
+
+# Serializes the changes to the store made while the app is running.
+_store_lock = Lock()
+
+
+def get_file_stamp(path: str) -> list:
+    """Get the size and modification stamp of a file, None if it is gone.
+
+    :param path: The file of interest.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def is_fresh(layout: dict, path: str) -> bool:
+    """Check whether a stored table still matches the CSV file it was built
+    from. A table without a recorded source or whose CSV file is gone keeps
+    its stored copy.
+
+    :param layout: The layout of the stored table.
+    :param path: The CSV file of the table.
+    """
+    source = layout.get("source")
+    stamp = get_file_stamp(path) if source is not None else None
+
+    return stamp is None or stamp == source
+
+
+def _save_frame(frame: pd.DataFrame, path: str, source: str = None) -> dict:
+    """Save a numeric data frame as a npy file.
+
+    :param frame: The data frame to save.
+    :param path: Where to save the npy file.
+    :param source: The CSV file the frame was read from, if any.
+    :return: The column names and types needed to rebuild the frame, and the
+        stamp of its CSV file.
+    """
+    # Replace the file at once, so open memory maps keep the old data.
+    with open(f"{path}.tmp", "wb") as npy_file:
+        np.save(npy_file, frame.to_numpy(dtype=np.float64))
+    os.replace(f"{path}.tmp", path)
+
+    return {
+        "columns": [str(column) for column in frame.columns],
+        "dtypes": [str(dtype) for dtype in frame.dtypes],
+        "source": get_file_stamp(source) if source is not None else None
+    }
+
+
+def _load_frame(path: str, layout: dict) -> pd.DataFrame:
+    """Load a numeric data frame from a memory-mapped npy file.
+
+    :param path: Where the npy file is.
+    :param layout: The column names and types saved with the frame.
+    :return: The data frame, backed by the memory map when all columns are
+        floats.
+    """
+    values = np.load(path, mmap_mode="r")
+
+    # Floats can be handed to pandas without copying the data.
+    if all(dtype == "float64" for dtype in layout["dtypes"]):
+        return pd.DataFrame(values, columns=layout["columns"], copy=False)
+
+    # Otherwise restore the type of each column.
+    return pd.DataFrame({
+        column: values[:, index].astype(dtype)
+        for index, (column, dtype) in enumerate(
+            zip(layout["columns"], layout["dtypes"])
+        )
+    })
+
+
+def get_source_path(name: str, hop: int, table: str) -> str:
+    """Get the CSV file of one table of a hop.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :param table: The table of interest, one of HOP_TABLES.
+    """
+    return f"{DATA_PATH}/{name}/{hop}/{table}.csv"
+
+
+def save_hop(name: str,
+             hop: int,
+             frames: Dict[str, pd.DataFrame],
+             from_csv: bool = False) -> dict:
+    """Save the tables of one hop to the store.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :param frames: The xyz, angle and force data frames of the hop.
+    :param from_csv: Whether the frames were read from the CSV files of the
+        hop, whose stamps are then recorded.
+    :return: The layout of each saved table.
+    """
+    hop_path = f"{STORE_PATH}/{name}/{hop}"
+    os.makedirs(hop_path, exist_ok=True)
+
+    return {
+        table: _save_frame(
+            frame=frames[table],
+            path=f"{hop_path}/{table}.npy",
+            source=get_source_path(name=name, hop=hop, table=table)
+            if from_csv else None
+        )
+        for table in HOP_TABLES
+    }
+
+
+def build_hop_store(toad_hop: Dict[str, List[int]]):
+    """Convert the raw CSV data into the binary hop store.
+
+    :param toad_hop: Toad names and their hop numbers.
+    """
+    # Start from an empty store.
+    shutil.rmtree(STORE_PATH, ignore_errors=True)
+    os.makedirs(STORE_PATH)
+
+    index = {"hops": {}, "time": {}, "info": {}}
+
+    for name, hops in toad_hop.items():
+        for hop in hops:
+            index["hops"][f"{name}/{hop}"] = save_hop(
+                name=name,
+                hop=hop,
+                frames=_read_hop(name=name, hop=hop),
+                from_csv=True
+            )
+
+        index["time"][name] = _save_time(name=name)
+
+    index["info"] = _save_all_hop_info()
+
+    # Write the index last, the store is only used once it exists.
+    save_store_index(index=index)
+
+
+def _read_hop(name: str, hop: int) -> Dict[str, pd.DataFrame]:
+    """Read the tables of one hop from its CSV files.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    """
+    return {
+        table: pd.read_csv(get_source_path(name=name, hop=hop, table=table))
+        for table in HOP_TABLES
+    }
+
+
+def _save_time(name: str) -> dict:
+    """Copy the time table of a toad from its CSV file into the store.
+
+    :param name: The toad of interest.
+    :return: The layout of the saved table.
+    """
+    # The time table is numeric, store it the same way as the hops.
+    return _save_frame(
+        frame=pd.read_csv(f"{DATA_PATH}/{name}/time.csv"),
+        path=f"{STORE_PATH}/{name}/time.npy",
+        source=f"{DATA_PATH}/{name}/time.csv"
+    )
+
+
+def _save_all_hop_info() -> dict:
+    """Copy all hopping info from its CSV file into the store.
+
+    :return: The stamp of the CSV file.
+    """
+    # All hopping info holds text, keep it as a pickled data frame.
+    pd.read_csv(f"{DATA_PATH}/All Hopping Info.csv").to_pickle(
+        f"{STORE_PATH}/all_hop_info.pkl.tmp"
+    )
+    os.replace(
+        f"{STORE_PATH}/all_hop_info.pkl.tmp",
+        f"{STORE_PATH}/all_hop_info.pkl"
+    )
+
+    return {"source": get_file_stamp(f"{DATA_PATH}/All Hopping Info.csv")}
+
+
+def save_store_index(index: dict):
+    """Save the index of the hop store, replacing the old one at once.
+
+    :param index: The layout of every stored hop and time table.
+    """
+    with open(f"{STORE_PATH}/index.json.tmp", "w") as index_file:
+        json.dump(index, index_file)
+    os.replace(f"{STORE_PATH}/index.json.tmp", f"{STORE_PATH}/index.json")
+
+    clear_store_cache()
+
+
+def update_stored_hop(name: str, hop: int):
+    """Copy one hop and the metadata of its toad from their CSV files into a
+    built store, replacing what the store held. A toad the store was built
+    without is left to be read from its CSV files.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    """
+    with _store_lock:
+        index = {
+            key: dict(value) for key, value in get_store_index().items()
+        }
+        if name not in index["time"]:
+            return
+
+        # Write the tables first, the index only points to complete files.
+        index["hops"][f"{name}/{hop}"] = save_hop(
+            name=name,
+            hop=hop,
+            frames=_read_hop(name=name, hop=hop),
+            from_csv=True
+        )
+        index["time"][name] = _save_time(name=name)
+        index["info"] = _save_all_hop_info()
+
+        save_store_index(index=index)
+
+
+def _get_cache_stamp(path: str) -> tuple:
+    """Get the size and modification stamp of a file as a cache key, None if
+    it is gone.
+
+    :param path: The file of interest.
+    """
+    stamp = get_file_stamp(path)
+    return tuple(stamp) if stamp is not None else None
+
+
+def get_store_index() -> dict:
+    """Get the index of the hop store, an empty one if it is not built.
+
+    The index is read again whenever its file changes, so a change made by
+    another process is seen as well.
+    """
+    return _read_store_index(
+        stamp=_get_cache_stamp(f"{STORE_PATH}/index.json")
+    )
+
+
+@lru_cache(maxsize=1)
+def _read_store_index(stamp: tuple) -> dict:
+    """Read the index of the hop store.
+
+    :param stamp: The stamp of the index file, which keys the cache.
+    """
+    try:
+        with open(f"{STORE_PATH}/index.json") as index_file:
+            return json.load(index_file)
+    except FileNotFoundError:
+        return {"hops": {}, "time": {}, "info": {}}
+
+
+def has_stored_hop(name: str, hop: int) -> bool:
+    """Check whether one hop of a specific toad is in the hop store and its
+    CSV files did not change since it was stored.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    """
+    layout = get_store_index()["hops"].get(f"{name}/{hop}")
+
+    return layout is not None and all(
+        is_fresh(
+            layout=layout[table],
+            path=get_source_path(name=name, hop=hop, table=table)
+        )
+        for table in HOP_TABLES
+    )
+
+
+def load_hop(name: str, hop: int) -> Dict[str, pd.DataFrame]:
+    """Load the xyz, angle and force tables of one hop from the store.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :return: A dictionary where the key is table name and the item is data.
+    """
+    layout = get_store_index()["hops"][f"{name}/{hop}"]
+
+    return {
+        table: _load_frame(
+            path=f"{STORE_PATH}/{name}/{hop}/{table}.npy",
+            layout=layout[table]
+        )
+        for table in HOP_TABLES
+    }
+
+
+def load_time(name: str) -> pd.DataFrame:
+    """Load the time table of a specific toad from the store.
+
+    :param name: The toad of interest.
+    """
+    return _load_time(
+        name=name, stamp=_get_cache_stamp(f"{STORE_PATH}/{name}/time.npy")
+    )
+
+
+# The tables are keyed by their file stamps, so a table replaced while it is
+# read is never cached under the stamp of the new file.
+@lru_cache(maxsize=256)
+def _load_time(name: str, stamp: tuple) -> pd.DataFrame:
+    """Load the time table of a specific toad as it is on disk now.
+
+    :param name: The toad of interest.
+    :param stamp: The stamp of the time table file, which keys the cache.
+    """
+    return _load_frame(
+        path=f"{STORE_PATH}/{name}/time.npy",
+        layout=get_store_index()["time"][name]
+    )
+
+
+def load_all_hop_info() -> pd.DataFrame:
+    """Load all hopping info from the store."""
+    return _load_all_hop_info(
+        stamp=_get_cache_stamp(f"{STORE_PATH}/all_hop_info.pkl")
+    )
+
+
+@lru_cache(maxsize=1)
+def _load_all_hop_info(stamp: tuple) -> pd.DataFrame:
+    """Load all hopping info as it is on disk now.
+
+    :param stamp: The stamp of the hopping info file, which keys the cache.
+    """
+    return pd.read_pickle(f"{STORE_PATH}/all_hop_info.pkl")
+
+
+def clear_store_cache():
+    """Forget the store index and tables loaded so far."""
+    _read_store_index.cache_clear()
+    _load_time.cache_clear()
+    _load_all_hop_info.cache_clear()
+
+
+if __name__ == "__main__":
+    from lilypadz.model.registry import get_registered_toad_hop
+    build_hop_store(toad_hop=get_registered_toad_hop())
@@ -0,0 +1,105 @@
+"""This file downsamples traces while keeping their shape."""
+
+import numpy as np
+from typing import Dict, List
+
+
+def lttb(x_value: np.ndarray,
+         y_value: np.ndarray,
+         threshold: int) -> np.ndarray:
+    """Select points with the largest triangle three buckets algorithm.
+
+    The first and last points are always kept. The points in between are
+    split into buckets, and from each bucket the point that makes the
+    largest triangle with the point kept before it and the average of the
+    next bucket is kept.
+
+    :param x_value: The x values, either shared with the shape of (point,) or
+        one row per trace with the shape of (trace, point).
+    :param y_value: The y values with the shape of (trace, point).
+    :param threshold: Number of points to keep from each trace.
+    :return: Indices of the kept points with the shape of (trace, threshold),
+        or of every point when there are not more points than the threshold.
+    """
+    num_trace, num_point = y_value.shape
+    x_value = np.broadcast_to(x_value, y_value.shape).astype(float)
+    y_value = y_value.astype(float)
+
+    if threshold >= num_point or threshold < 3:
+        return np.tile(np.arange(num_point), (num_trace, 1))
+
+    # Bucket boundaries, the first and last points have their own buckets.
+    every = (num_point - 2) / (threshold - 2)
+    edges = np.floor(np.arange(threshold - 1) * every).astype(int) + 1
+    edges[-1] = num_point - 1
+
+    trace_index = np.arange(num_trace)
+    selected = np.zeros((num_trace, threshold), dtype=int)
+    selected[:, -1] = num_point - 1
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Average of the next bucket, which is the last point at the end.
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else num_point
+        average_x = np.nanmean(x_value[:, end:next_end], axis=1)
+        average_y = np.nanmean(y_value[:, end:next_end], axis=1)
+
+        # The point kept from the previous bucket.
+        previous_x = x_value[trace_index, selected[:, bucket]]
+        previous_y = y_value[trace_index, selected[:, bucket]]
+
+        # Twice the area of the triangle made with each point in the bucket.
+        area = np.abs(
+            (previous_x - average_x)[:, np.newaxis] *
+            (y_value[:, start:end] - previous_y[:, np.newaxis]) -
+            (previous_x[:, np.newaxis] - x_value[:, start:end]) *
+            (average_y - previous_y)[:, np.newaxis]
+        )
+
+        # Missing values never win.
+        selected[:, bucket + 1] = start + np.argmax(
+            np.nan_to_num(area, nan=-1.0), axis=1
+        )
+
+    return selected
+
+
+def downsample_traces(traces: List[dict], max_points: int) -> List[dict]:
+    """Downsample the traces of a plot to a total budget of points.
+
+    :param traces: Traces with x and y values.
+    :param max_points: Total number of points to keep, shared evenly among
+        the traces.
+    :return: The traces with only the kept points.
+    """
+    if not traces:
+        return traces
+
+    threshold = max(3, max_points // len(traces))
+
+    # Downsample traces of the same length together.
+    groups: Dict[int, List[int]] = {}
+    for index, trace in enumerate(traces):
+        groups.setdefault(len(trace["y"]), []).append(index)
+
+    downsampled = list(traces)
+    for length, indices in groups.items():
+        if length <= threshold:
+            continue
+
+        x_value = np.array([traces[index]["x"] for index in indices])
+        y_value = np.array([traces[index]["y"] for index in indices])
+        selected = lttb(
+            x_value=x_value, y_value=y_value, threshold=threshold
+        )
+        rows = np.arange(len(indices))[:, np.newaxis]
+        kept_x = x_value[rows, selected]
+        kept_y = y_value[rows, selected]
+
+        for row, index in enumerate(indices):
+            downsampled[index] = dict(
+                traces[index], x=kept_x[row], y=kept_y[row]
+            )
+
+    return downsampled
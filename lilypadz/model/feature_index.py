@@ -0,0 +1,40 @@
+"""This file summarizes the recorded frames of every hop of the hop tensor
+into features."""
+
+import warnings
+import numpy as np
+import pandas as pd
+from typing import List
+from lilypadz.model.hop_tensor import get_hop_tensor
+
+# Summary statistics and the functions that compute them over time.
+STATISTICS = {
+    "mean": np.nanmean,
+    "std": np.nanstd,
+    "min": np.nanmin,
+    "max": np.nanmax
+}
+
+
+def get_features(names: List[str],
+                 variable: List[str],
+                 statistic: str = "mean") -> pd.DataFrame:
+    """Get one summary statistic of some variables for some toads.
+
+    :param names: Names of the desired toads.
+    :param variable: Variable of interest.
+    :param statistic: The summary statistic, one of STATISTICS.
+    :return: A data frame with one row per hop, indexed by the hop name,
+        without the hops that miss any of the features.
+    """
+    # Select the hops of the toads, in the order they are asked for.
+    tensor = get_hop_tensor().select(names=names, variable=variable)
+
+    # Empty hops leave the features as NaN.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        values = STATISTICS[statistic](tensor.frames, axis=1)
+
+    return pd.DataFrame(
+        index=tensor.labels, data=values
+    ).dropna(axis="index")
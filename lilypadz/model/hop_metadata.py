@@ -0,0 +1,47 @@
+"""This file indexes the hopping info and time data of every hop."""
+
+from typing import Dict, NamedTuple, Tuple
+from lilypadz.helper.cache import LRUCache
+from lilypadz.model.data_reader import get_all_hop_info, get_metadata_stamp, \
+    get_time
+from lilypadz.model.registry import get_registered_toad_hop
+
+
+class MetadataIndex(NamedTuple):
+    """Rows of the hop metadata, keyed for constant time lookups."""
+
+    # Key is toad, hop number and hop phase, item is the hopping info row.
+    info: Dict[Tuple[str, int, str], dict]
+    # Key is toad and hop number, item is the time row.
+    timing: Dict[Tuple[str, int], dict]
+
+
+def build_metadata_index() -> MetadataIndex:
+    """Index all hopping info and the time data of every toad.
+
+    When a key appears more than once, the first row is kept.
+    """
+    info = {}
+    for row in get_all_hop_info().to_dict("records"):
+        info.setdefault((row["ID"], row["Hop Number"], row["Hop Phase"]), row)
+
+    timing = {}
+    for name in get_registered_toad_hop().keys():
+        for row in get_time(name=name).to_dict("records"):
+            timing.setdefault((name, row["Hop"]), row)
+
+    return MetadataIndex(info=info, timing=timing)
+
+
+# The latest metadata index, keyed by the stamps of the metadata files.
+METADATA_INDEX_CACHE = LRUCache(max_size=1)
+
+
+def get_metadata_index() -> MetadataIndex:
+    """Get the metadata index, rebuilding it when a metadata file changed."""
+    return METADATA_INDEX_CACHE.get(
+        key=get_metadata_stamp(
+            names=list(get_registered_toad_hop().keys())
+        ),
+        compute=build_metadata_index
+    )
@@ -0,0 +1,205 @@
+"""This file stacks every processed hop into dense arrays, both as recorded
+and resampled to the same number of time points."""
+
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import List, NamedTuple, Tuple
+from lilypadz.helper.cache import LRUCache
+from lilypadz.helper.constant import KINEMATIC_VARIABLES, \
+    FORCE_PLATE_VARIABLES, TENSOR_POINTS
+from lilypadz.model.data_reader import get_all_hop_stamp
+from lilypadz.model.data_processor import get_processed_hops
+from lilypadz.model.registry import get_registered_toad_hop
+
+# Variables of the last axis of the tensor, kinematic ones first.
+VARIABLES = KINEMATIC_VARIABLES + FORCE_PLATE_VARIABLES
+
+
+class HopTensor(NamedTuple):
+    """Every processed hop as recorded and resampled to the same number of
+    time points."""
+
+    # Values with the shape of (hop, time, variable).
+    values: np.ndarray
+    # Recorded frames with the shape of (hop, frame, variable), padded at the
+    # end with NaN.
+    frames: np.ndarray
+    toad: np.ndarray
+    hop: np.ndarray
+    sight: np.ndarray
+    # Number of frames recorded for each variable of each hop, with the
+    # shape of (hop, variable).
+    lengths: np.ndarray
+    # Hash of the source file stamps the tensor was computed from.
+    version: str = ""
+    # Toad, hop number and source file stamps of each hop.
+    stamp: tuple = ()
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Get the name of each hop as shown in the plots."""
+        return np.array([
+            f"{toad} hop {hop} {sight}"
+            for toad, hop, sight in zip(self.toad, self.hop, self.sight)
+        ], dtype=object)
+
+    def get_version(self, names: List[str]) -> str:
+        """Get a hash of the source file stamps of the hops of some toads.
+
+        :param names: Names of the desired toads.
+        :return: A version that only changes with the hops of these toads.
+        """
+        return hashlib.sha1(repr(tuple(
+            hop_stamp for hop_stamp in self.stamp if hop_stamp[0] in names
+        )).encode()).hexdigest()
+
+    def select(self, names: List[str], variable: List[str]) -> "HopTensor":
+        """Get the hops of some toads and some of the variables.
+
+        :param names: Names of the desired toads, in the order to keep.
+        :param variable: Variable of interest.
+        :return: A tensor of only the selected hops and variables.
+        """
+        rows = np.concatenate(
+            [np.flatnonzero(self.toad == name) for name in names] +
+            [np.array([], dtype=int)]
+        )
+        columns = [
+            index for index, column in enumerate(VARIABLES)
+            if column in variable
+        ]
+
+        return self._replace(
+            values=np.ascontiguousarray(self.values[np.ix_(
+                rows, np.arange(self.values.shape[1]), columns
+            )]),
+            frames=np.ascontiguousarray(self.frames[np.ix_(
+                rows, np.arange(self.frames.shape[1]), columns
+            )]),
+            toad=self.toad[rows],
+            hop=self.hop[rows],
+            sight=self.sight[rows],
+            lengths=self.lengths[np.ix_(rows, columns)]
+        )
+
+
+def stack_tables(
+        data: List[pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack tables of different lengths, padding the end with NaN.
+
+    :param data: Tables with the same columns.
+    :return: An array with the shape of (table, row, column), at least one
+        row long, and the length of each table.
+    """
+    lengths = np.array([len(table.index) for table in data], dtype=int)
+    num_column = data[0].shape[1] if data else 0
+
+    stacked = np.full((len(data), max(lengths.max(initial=0), 1), num_column),
+                      np.nan)
+    for index, table in enumerate(data):
+        stacked[index, :lengths[index]] = table.to_numpy(dtype=np.float64)
+
+    return stacked, lengths
+
+
+def resample(stacked: np.ndarray,
+             lengths: np.ndarray,
+             num_points: int) -> np.ndarray:
+    """Linearly resample tables of different lengths to the same length.
+
+    Each table is stretched so that its first and last rows land on the first
+    and last points, the same as ``np.interp`` over evenly spaced points.
+
+    :param stacked: Tables stacked by stack_tables.
+    :param lengths: The length of each table.
+    :param num_points: Number of time points to resample to.
+    :return: An array with the shape of (table, time, column), NaN for empty
+        tables.
+    """
+    # Position of each new point between the rows of its table.
+    position = np.linspace(0, 1, num_points) * \
+        np.maximum(lengths - 1, 0)[:, np.newaxis]
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, np.maximum(lengths - 1, 0)[:, np.newaxis])
+    weight = (position - lower)[..., np.newaxis]
+
+    hop_index = np.arange(len(stacked))[:, np.newaxis]
+    resampled = stacked[hop_index, lower] * (1 - weight) + \
+        stacked[hop_index, upper] * weight
+
+    # Points that land on a row keep its value even if the next row is NaN.
+    resampled = np.where(weight == 0, stacked[hop_index, lower], resampled)
+    resampled[lengths == 0] = np.nan
+
+    return resampled
+
+
+def build_hop_tensor(num_points: int = TENSOR_POINTS) -> HopTensor:
+    """Stack and resample the landing phase of every hop of every toad.
+
+    :param num_points: Number of time points to resample to.
+    """
+    keys = [
+        (toad, hop)
+        for toad, hops in get_registered_toad_hop().items() for hop in hops
+    ]
+    processed_hops = get_processed_hops(name_hops=keys)
+
+    kinematic, kinematic_lengths = stack_tables(data=[
+        processed_hop.kinematic[KINEMATIC_VARIABLES]
+        for processed_hop in processed_hops
+    ])
+    force_plate, force_plate_lengths = stack_tables(data=[
+        processed_hop.force_plate[FORCE_PLATE_VARIABLES]
+        for processed_hop in processed_hops
+    ])
+
+    # Pad both kinds of tables to the same number of frames.
+    num_frames = max(kinematic.shape[1], force_plate.shape[1])
+
+    return HopTensor(
+        values=np.ascontiguousarray(np.concatenate([
+            resample(stacked=kinematic, lengths=kinematic_lengths,
+                     num_points=num_points),
+            resample(stacked=force_plate, lengths=force_plate_lengths,
+                     num_points=num_points)
+        ], axis=-1)),
+        frames=np.concatenate([
+            np.pad(stacked, ((0, 0), (0, num_frames - stacked.shape[1]),
+                             (0, 0)), constant_values=np.nan)
+            for stacked in (kinematic, force_plate)
+        ], axis=-1),
+        toad=np.array([toad for toad, _ in keys], dtype=object),
+        hop=np.array([hop for _, hop in keys], dtype=int),
+        sight=np.array(
+            [processed_hop.sight for processed_hop in processed_hops],
+            dtype=object
+        ),
+        lengths=np.concatenate([
+            np.repeat(kinematic_lengths[:, np.newaxis],
+                      len(KINEMATIC_VARIABLES), axis=1),
+            np.repeat(force_plate_lengths[:, np.newaxis],
+                      len(FORCE_PLATE_VARIABLES), axis=1)
+        ], axis=1)
+    )
+
+
+# Hop tensors keyed by the number of points and the stamps of all files.
+HOP_TENSOR_CACHE = LRUCache(max_size=4)
+
+
+def get_hop_tensor(num_points: int = TENSOR_POINTS) -> HopTensor:
+    """Get the hop tensor, rebuilding it when a source file changed.
+
+    :param num_points: Number of time points to resample to.
+    """
+    stamp = get_all_hop_stamp()
+
+    return HOP_TENSOR_CACHE.get(
+        key=(num_points, stamp),
+        compute=lambda: build_hop_tensor(num_points=num_points)._replace(
+            version=hashlib.sha1(repr(stamp).encode()).hexdigest(),
+            stamp=stamp
+        )
+    )
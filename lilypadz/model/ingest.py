@@ -0,0 +1,251 @@
+"""This file adds uploaded hops to the data directory while the app runs.
+
+An uploaded hop is saved as CSV files laid out the same as the raw data, so
+it is registered like any other hop and kept when the store is rebuilt.
+"""
+
+import io
+import os
+import csv
+import math
+import numpy as np
+import pandas as pd
+from threading import Lock
+from typing import IO, Tuple
+from lilypadz.data.calculate_angle import convert_xyz_to_kinematic
+from lilypadz.helper.constant import DATA_PATH, SIGHT_BLIND_COLOR
+from lilypadz.model.clustering import CLUSTERING_CACHE
+from lilypadz.model.data_processor import PROCESSED_HOP_CACHE, process_hop
+from lilypadz.model.data_reader import HopData
+from lilypadz.model.data_store import get_source_path, update_stored_hop
+from lilypadz.model.registry import get_registered_toad_hop, \
+    refresh_registry
+
+# Serializes the uploads, so two of them never edit the same CSV file.
+_ingest_lock = Lock()
+
+
+def read_xyz(xyz_file: IO) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Parse xyz data and calculate its angles.
+
+    :param xyz_file: The xyz file, read as a stream.
+    :return: The xyz data and its angle data, laid out as in angle.csv.
+    """
+    xyz_data = pd.read_csv(xyz_file)
+
+    if len(xyz_data.columns) < 18 or len(xyz_data.columns) % 3 != 0:
+        raise ValueError("The xyz file needs X, Y, Z columns of points.")
+    if xyz_data.empty:
+        raise ValueError("The xyz file is empty.")
+
+    angle_data = convert_xyz_to_kinematic(xyz_data=xyz_data)
+
+    # The angle.csv files keep their row numbers as the first column.
+    angle_data.insert(0, "Unnamed: 0", np.arange(len(angle_data.index)))
+
+    return xyz_data, angle_data
+
+
+def read_force(force_file: IO) -> pd.DataFrame:
+    """Parse force plate data.
+
+    :param force_file: The force file, read as a stream.
+    :return: The force data, whose first row is taken as the header the same
+        as for force.csv.
+    """
+    force_data = pd.read_csv(force_file)
+
+    if len(force_data.columns) < 3:
+        raise ValueError("The force file needs three force columns.")
+
+    return force_data
+
+
+def check_hop(hop_data: HopData, timing: dict, sight: str):
+    """Check that a hop can be processed, before it is stored.
+
+    :param hop_data: The xyz, angle and force data of the hop.
+    :param timing: The row of the hop in the time data of its toad.
+    :param sight: Whether the toad was "Sighted" or "Blind" for the hop.
+    """
+    if not all(
+            math.isfinite(timing[column])
+            for column in ("Onset", "First Touch", "Recovery")):
+        raise ValueError("The onset, first touch and recovery must be "
+                         "finite numbers.")
+
+    # The landing is counted in rows of the angle data from the onset.
+    onset = round(timing["Onset"])
+    kinematic_start = abs((round(timing["First Touch"]) - onset) / 2)
+    kinematic_end = abs((round(timing["Recovery"]) - onset) / 2)
+    if not kinematic_start < kinematic_end <= len(hop_data.angle.index):
+        raise ValueError("The first touch and recovery must be apart and "
+                         "within the frames of the xyz file.")
+
+    # Process the hop the same way as a stored one, so a hop that would
+    # fail later is refused now.
+    try:
+        processed_hop = process_hop(
+            hop_data=hop_data, timing=timing, sight=sight
+        )
+    except (ValueError, KeyError, IndexError) as error:
+        raise ValueError(f"The hop can not be processed: {error}") \
+            from error
+
+    if processed_hop.force_plate.empty:
+        raise ValueError("The force file has no landing to process.")
+
+
+def _write_file(path: str, content: bytes):
+    """Write a file, replacing the old one at once.
+
+    :param path: Where to write the file.
+    :param content: The content of the file.
+    """
+    with open(f"{path}.tmp", "wb") as new_file:
+        new_file.write(content)
+    os.replace(f"{path}.tmp", path)
+
+
+def _is_match(cell: str, value) -> bool:
+    """Check whether a CSV cell holds a value, comparing numbers as numbers.
+
+    :param cell: The text of the cell.
+    :param value: The value of interest.
+    """
+    if isinstance(value, str):
+        return cell == value
+
+    try:
+        return float(cell) == value
+    except ValueError:
+        return False
+
+
+def replace_csv_rows(path: str, match: dict, row: dict):
+    """Replace the rows of a CSV file that match some values with one row,
+    leaving every other line of the file as it was.
+
+    :param path: The CSV file of interest.
+    :param match: The values of the columns that pick the rows to replace.
+    :param row: The new row, a column it lacks is left empty.
+    """
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        lines = csv_file.read().splitlines(keepends=True)
+
+    # Some of the files start with a byte order mark and end in CRLF.
+    header = next(csv.reader([lines[0].lstrip("\ufeff")]))
+    line_end = "\r\n" if lines[0].endswith("\r\n") else "\n"
+    positions = {column: header.index(column) for column in match}
+
+    kept = [lines[0]]
+    for line in lines[1:]:
+        cells = next(csv.reader([line]), [])
+        if not all(
+                len(cells) > positions[column] and
+                _is_match(cell=cells[positions[column]], value=value)
+                for column, value in match.items()):
+            kept.append(line)
+    if not kept[-1].endswith(("\r", "\n")):
+        kept[-1] += line_end
+
+    new_line = io.StringIO()
+    csv.writer(new_line, lineterminator=line_end).writerow(
+        [row.get(column, "") for column in header]
+    )
+
+    _write_file(
+        path=path,
+        content="".join(kept + [new_line.getvalue()]).encode("utf-8")
+    )
+
+
+def ingest_hop(name: str,
+               hop: int,
+               sight: str,
+               onset: float,
+               first_touch: float,
+               recovery: float,
+               xyz_file: IO,
+               force_file: IO) -> dict:
+    """Add one hop of a known toad to the data directory and make it
+    available.
+
+    :param name: The toad of interest.
+    :param hop: The hop number of interest.
+    :param sight: Whether the toad was "Sighted" or "Blind" for the hop.
+    :param onset: Onset of the hop in the time data.
+    :param first_touch: First touch of the hop in the time data.
+    :param recovery: Recovery of the hop in the time data.
+    :param xyz_file: The xyz file of the hop.
+    :param force_file: The force plate file of the hop.
+    :return: The toad, hop number and number of frames of the added hop.
+    """
+    if name not in get_registered_toad_hop():
+        raise ValueError(f"Unknown toad {name}.")
+    if sight not in SIGHT_BLIND_COLOR:
+        raise ValueError(f"Unknown sight {sight}.")
+
+    # Keep the uploaded files as they are, to save them as the raw data.
+    xyz_content = xyz_file.read()
+    force_content = force_file.read()
+    xyz_data, angle_data = read_xyz(xyz_file=io.BytesIO(xyz_content))
+    force_data = read_force(force_file=io.BytesIO(force_content))
+    timing = {
+        "Hop": hop,
+        "Onset": onset,
+        "First Touch": first_touch,
+        "Recovery": recovery
+    }
+
+    # Nothing is written until the hop is known to process.
+    check_hop(
+        hop_data=HopData(xyz=xyz_data, angle=angle_data, force=force_data),
+        timing=timing,
+        sight=sight
+    )
+
+    with _ingest_lock:
+        os.makedirs(f"{DATA_PATH}/{name}/{hop}", exist_ok=True)
+        _write_file(
+            path=get_source_path(name=name, hop=hop, table="xyz"),
+            content=xyz_content
+        )
+        _write_file(
+            path=get_source_path(name=name, hop=hop, table="force"),
+            content=force_content
+        )
+        _write_file(
+            path=get_source_path(name=name, hop=hop, table="angle"),
+            content=angle_data.iloc[:, 1:].to_csv().encode("utf-8")
+        )
+
+        replace_csv_rows(
+            path=f"{DATA_PATH}/All Hopping Info.csv",
+            match={"ID": name, "Hop Number": hop},
+            row={
+                "ID": name,
+                "Hop Number": hop,
+                "Hop Phase": "Landing",
+                "Sight": sight
+            }
+        )
+        # The time table goes last, its row is what registers the hop.
+        replace_csv_rows(
+            path=f"{DATA_PATH}/{name}/time.csv",
+            match={"Hop": hop},
+            row=timing
+        )
+
+        # Keep a built store in step, a rebuild reads the same files.
+        update_stored_hop(name=name, hop=hop)
+
+    # Register the hop, so every toad wide result picks it up.
+    refresh_registry()
+
+    # Only the results built from the hop or its toad are dropped, the rest
+    # are keyed by stamps that did not change.
+    PROCESSED_HOP_CACHE.discard(match=lambda key: key[:2] == (name, hop))
+    CLUSTERING_CACHE.discard(match=lambda key: name in key[0])
+
+    return {"toad": name, "hop": hop, "frames": len(xyz_data.index)}
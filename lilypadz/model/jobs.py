@@ -0,0 +1,379 @@
+"""This file runs the heavy analysis requests as jobs in a process pool.
+
+A job is named by a hash of its kind, its options and the dataset version,
+so the same request submitted again while it runs is given the same job.
+The pool starts its workers on the first job. Once the server asks for a
+warm pool, its workers are started at once and each one warms up its own
+caches first, so the first jobs do not pay for it.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+from threading import Lock
+from typing import List, NamedTuple, Union
+from flask import Flask, Response
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from lilypadz.helper.cache import LRUCache
+from lilypadz.helper.constant import JOB_HISTORY_SIZE, JOB_PYTHON, \
+    JOB_START_METHOD, JOB_WORKERS
+from lilypadz.model.clustering import CLUSTERING_METHODS, \
+    get_all_clustering_result, get_one_clustering_result
+from lilypadz.model.data_processor import set_hop_loading_pool
+from lilypadz.model.data_reader import get_dataset_version
+from lilypadz.model.small_series import AGGREGATE_BANDS, \
+    get_ss_for_one_toad, get_ss_for_multiple_toads, \
+    get_ss_for_one_toad_sight, get_ss_for_multiple_toads_sight
+from lilypadz.model.warm_up import warm_up
+
+
+def get_whole_number(options: dict,
+                     key: str,
+                     default: int = None,
+                     minimum: int = 1) -> int:
+    """Read a whole number option posted by the front end.
+
+    :param options: The options posted by the front end.
+    :param key: The name of the option.
+    :param default: What to give when the option is missing or empty.
+    :param minimum: The smallest number allowed.
+    :return: The number.
+    """
+    value = options.get(key)
+    if value is None or value == "":
+        return default
+
+    # Reading the text turns away fractions and booleans as well.
+    try:
+        number = int(str(value))
+    except ValueError:
+        raise ValueError(f"{key} must be a whole number.") from None
+
+    if number < minimum:
+        raise ValueError(f"{key} must be at least {minimum}.")
+
+    return number
+
+
+def check_options(kind: str, options: dict):
+    """Check the options of a request before its result is computed.
+
+    :param kind: The kind of request, one of JOB_KINDS.
+    :param options: The options posted by the front end.
+    :raise ValueError: When an option is missing or has a wrong value.
+    """
+    required = ["compare", "variable"] + (
+        ["sight"] if kind == "small_series" else ["num_cluster"]
+    )
+    for key in required + ["toads" if options.get("compare") else "toad"]:
+        if key not in options:
+            raise ValueError(f"Missing {key}.")
+
+    if kind == "small_series":
+        get_whole_number(options=options, key="max_points")
+        aggregate = options.get("aggregate")
+        if aggregate is not None and aggregate not in AGGREGATE_BANDS:
+            raise ValueError(f"Unknown aggregate band {aggregate}.")
+    else:
+        get_whole_number(options=options, key="num_cluster")
+        get_whole_number(options=options, key="seed", minimum=0)
+        method = options.get("method", "full")
+        if method not in CLUSTERING_METHODS:
+            raise ValueError(f"Unknown clustering method {method}.")
+
+
+def get_small_series(options: dict) -> dict:
+    """Get the small series asked for by the front end options.
+
+    :param options: The options posted by the front end.
+    """
+    max_points = get_whole_number(options=options, key="max_points")
+    if not options["sight"]:
+        if options["compare"]:
+            return get_ss_for_multiple_toads(
+                names=options["toads"].split("!"),
+                variable=options["variable"].split("!"),
+                output=options.get("output", "html"),
+                max_points=max_points,
+                aggregate=options.get("aggregate")
+            )
+        else:
+            return get_ss_for_one_toad(
+                name=options["toad"],
+                variable=options["variable"].split("!"),
+                output=options.get("output", "html"),
+                max_points=max_points
+            )
+    else:
+        if options["compare"]:
+            return get_ss_for_multiple_toads_sight(
+                names=options["toads"].split("!"),
+                variable=options["variable"].split("!"),
+                output=options.get("output", "html"),
+                max_points=max_points,
+                aggregate=options.get("aggregate")
+            )
+        else:
+            return get_ss_for_one_toad_sight(
+                name=options["toad"],
+                variable=options["variable"].split("!"),
+                output=options.get("output", "html"),
+                max_points=max_points,
+                aggregate=options.get("aggregate")
+            )
+
+
+def get_cluster(options: dict) -> dict:
+    """Get the clustering result asked for by the front end options.
+
+    :param options: The options posted by the front end.
+    """
+    if options["compare"]:
+        return get_all_clustering_result(
+            n_clusters=get_whole_number(options=options, key="num_cluster"),
+            names=options["toads"].split("!"),
+            variable=options["variable"].split("!"),
+            random_state=get_whole_number(
+                options=options, key="seed", default=0, minimum=0
+            ),
+            method=options.get("method", "full")
+        )
+    else:
+        return get_one_clustering_result(
+            n_clusters=get_whole_number(options=options, key="num_cluster"),
+            name=options["toad"],
+            variable=options["variable"].split("!"),
+            random_state=get_whole_number(
+                options=options, key="seed", default=0, minimum=0
+            ),
+            method=options.get("method", "full")
+        )
+
+
+# Kinds of jobs and the function that computes each.
+JOB_KINDS = {
+    "small_series": get_small_series,
+    "cluster": get_cluster
+}
+
+
+class JobStatus(NamedTuple):
+    """Status of a job, with its result once it is done."""
+
+    id: str
+    # One of "pending", "running", "done" and "failed".
+    status: str
+    result: Union[dict, str] = None
+    error: str = None
+
+
+# An app for the results to be converted to json in, a worker has no request.
+_job_app = Flask(__name__)
+
+
+def run_job(kind: str, options: dict) -> Union[dict, str]:
+    """Compute the result of a job in a worker.
+
+    :param kind: The kind of job, one of JOB_KINDS.
+    :param options: The options posted by the front end.
+    :return: The json data or the html string that the view would send.
+    """
+    with _job_app.app_context():
+        result = JOB_KINDS[kind](options)
+
+    return result.get_json() if isinstance(result, Response) else result
+
+
+def _start_job_worker(warm: bool):
+    """Set up a new worker, which loads hops in its own process only.
+
+    :param warm: Whether to process every hop before it takes a job.
+    """
+    set_hop_loading_pool(workers=1)
+    if warm:
+        warm_up()
+
+
+def _is_warm() -> bool:
+    """Tell that the worker running it is warm, which it is once started."""
+    return True
+
+
+def get_job_python() -> str:
+    """Get the Python that starts the job workers.
+
+    Servers that embed Python, such as mod_wsgi, set sys.executable to their
+    own binary, which can not run a worker.
+    """
+    if JOB_PYTHON is not None:
+        return JOB_PYTHON
+    if "python" in os.path.basename(sys.executable).lower():
+        return sys.executable
+
+    return os.path.join(sys.exec_prefix, "bin", "python3")
+
+
+def _create_job_executor(warm: bool) -> ProcessPoolExecutor:
+    """Create a pool of job workers, which start on first use.
+
+    :param warm: Whether each worker warms up its caches when it starts.
+    """
+    context = multiprocessing.get_context(JOB_START_METHOD)
+    if JOB_START_METHOD != "fork":
+        context.set_executable(get_job_python())
+
+    return ProcessPoolExecutor(
+        max_workers=JOB_WORKERS,
+        mp_context=context,
+        initializer=_start_job_worker,
+        initargs=(warm,)
+    )
+
+
+# The pool shared by every request, created by the first job or by
+# warm_job_pool, never on import as every worker imports this module too.
+_job_lock = Lock()
+_job_executor: ProcessPoolExecutor = None
+
+# A task given to each worker of the pool by warm_job_pool, None before.
+_job_warm_futures: List[Future] = None
+
+# The future of each recent job, keyed by the job id.
+JOB_CACHE = LRUCache(max_size=JOB_HISTORY_SIZE)
+
+
+def _get_job_executor() -> ProcessPoolExecutor:
+    """Get the pool, creating it on first use. The caller holds the job
+    lock."""
+    global _job_executor
+
+    if _job_executor is None:
+        _job_executor = _create_job_executor(
+            warm=_job_warm_futures is not None
+        )
+
+    return _job_executor
+
+
+def _warm_job_executor() -> List[Future]:
+    """Start every worker of the pool, each one warms up as it starts.
+
+    :return: A task for each worker, done once a worker is warm.
+    """
+    # A worker is started for every task while none of them is idle.
+    return [
+        _job_executor.submit(_is_warm)
+        for _ in range(JOB_WORKERS or os.cpu_count() or 1)
+    ]
+
+
+def warm_job_pool():
+    """Start and warm up every worker of the pool in the background.
+
+    Call it from the server process once it started, never on import.
+    """
+    global _job_executor, _job_warm_futures
+
+    with _job_lock:
+        if _job_warm_futures is not None:
+            return
+
+        # A pool started cold is replaced by one that warms up.
+        old_executor = _job_executor
+        _job_executor = _create_job_executor(warm=True)
+        _job_warm_futures = _warm_job_executor()
+
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+
+
+def is_job_pool_warm() -> bool:
+    """Check whether every worker of the pool started and warmed up."""
+    futures = _job_warm_futures
+
+    return futures is not None and all(
+        future.done() and not future.exception() for future in futures
+    )
+
+
+def get_job_id(kind: str, options: dict) -> str:
+    """Get the id of a job, the same for the same request on the same data.
+
+    :param kind: The kind of job, one of JOB_KINDS.
+    :param options: The options of the job.
+    """
+    return hashlib.sha1(
+        json.dumps(
+            [kind, options, get_dataset_version()], sort_keys=True
+        ).encode()
+    ).hexdigest()
+
+
+def submit_job(kind: str, options: dict) -> JobStatus:
+    """Start a job, unless the same job is pending, running or done.
+
+    :param kind: The kind of job, one of JOB_KINDS.
+    :param options: The options posted by the front end.
+    :return: The status of the job.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind}.")
+    check_options(kind=kind, options=options)
+
+    job_id = get_job_id(kind=kind, options=options)
+
+    with _job_lock:
+        future: Future = JOB_CACHE.lookup(key=job_id)
+
+        # A failed job is tried again.
+        if future is None or (future.done() and future.exception()):
+            try:
+                future = _get_job_executor().submit(run_job, kind, options)
+
+            # A worker died and took the pool with it, start a new one.
+            except BrokenProcessPool:
+                _replace_job_executor()
+                future = _job_executor.submit(run_job, kind, options)
+
+            JOB_CACHE.put(key=job_id, value=future)
+
+    return get_job_status(job_id=job_id)
+
+
+def get_job_status(job_id: str) -> JobStatus:
+    """Get the status of a job, with its result once it is done.
+
+    :param job_id: The id given when the job was submitted.
+    :return: The status of the job, None if it is unknown or too old.
+    """
+    future: Future = JOB_CACHE.lookup(key=job_id)
+
+    if future is None:
+        return None
+    if not future.done():
+        return JobStatus(
+            id=job_id, status="running" if future.running() else "pending"
+        )
+    if future.exception():
+        return JobStatus(
+            id=job_id, status="failed", error=repr(future.exception())
+        )
+
+    return JobStatus(id=job_id, status="done", result=future.result())
+
+
+def _replace_job_executor():
+    """Replace the pool with a new one, warmed up if the old one was. The
+    caller holds the job lock."""
+    global _job_executor, _job_warm_futures
+
+    old_executor = _job_executor
+    _job_executor = _create_job_executor(warm=_job_warm_futures is not None)
+    if _job_warm_futures is not None:
+        _job_warm_futures = _warm_job_executor()
+
+    # Jobs being run by the old pool are left to finish.
+    old_executor.shutdown(wait=False)
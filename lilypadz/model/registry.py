@@ -0,0 +1,184 @@
+"""This file discovers the toads and hops in the data directory.
+
+The files found are recorded in a small JSON index with their sizes and
+modification stamps. A refresh only lists the directories whose stamps
+changed since the index was saved, and reads a time table again only when
+it changed. Every process reads the index again once another one saved it.
+"""
+
+import os
+import json
+import pandas as pd
+from threading import Lock
+from typing import Dict, List, Sequence
+from lilypadz.helper.constant import DATA_PATH, REGISTRY_PATH
+from lilypadz.model.data_store import HOP_TABLES, get_file_stamp
+
+# The registry of this process and the stamp of the index it matches.
+_registry_lock = Lock()
+_registry: dict = None
+_registry_stamp: list = None
+
+
+def _list_directories(path: str) -> List[str]:
+    """Get the names of the directories directly under a directory.
+
+    :param path: The directory of interest.
+    """
+    return sorted(entry.name for entry in os.scandir(path) if entry.is_dir())
+
+
+def _refresh_hop(path: str, old_hop: dict) -> dict:
+    """Record the tables of one hop directory.
+
+    :param path: The hop directory.
+    :param old_hop: The record of the hop from the last refresh.
+    :return: The stamp of the directory and the stamp of each table in it.
+    """
+    mtime = os.stat(path).st_mtime_ns
+
+    # Look for the missing tables only when a file was added or removed.
+    tables = list(old_hop.get("tables", {})) \
+        if mtime == old_hop.get("mtime") else HOP_TABLES
+    stamps = {
+        table: get_file_stamp(f"{path}/{table}.csv") for table in tables
+    }
+
+    return {
+        "mtime": mtime,
+        "tables": {
+            table: stamp for table, stamp in stamps.items()
+            if stamp is not None
+        }
+    }
+
+
+def _refresh_toad(name: str, old_toad: dict) -> dict:
+    """Record the hops of one toad directory, reusing what did not change.
+
+    :param name: The toad of interest.
+    :param old_toad: The record of the toad from the last refresh.
+    :return: The stamps of the directory and time table, the hop numbers in
+        the time table and the record of each hop directory.
+    """
+    path = f"{DATA_PATH}/{name}"
+    mtime = os.stat(path).st_mtime_ns
+    time_stamp = get_file_stamp(f"{path}/time.csv")
+
+    # Read the time table again only when it changed.
+    timed = old_toad.get("timed", []) if time_stamp == old_toad.get("time") \
+        else sorted(
+            int(hop) for hop in pd.read_csv(f"{path}/time.csv")["Hop"]
+        )
+
+    # List the hop directories again only when one was added or removed.
+    hop_names = list(old_toad.get("hops", {})) \
+        if mtime == old_toad.get("mtime") else [
+            hop_name for hop_name in _list_directories(path)
+            if hop_name.isdigit()
+        ]
+
+    return {
+        "mtime": mtime,
+        "time": time_stamp,
+        "timed": timed,
+        "hops": {
+            hop_name: _refresh_hop(
+                path=f"{path}/{hop_name}",
+                old_hop=old_toad.get("hops", {}).get(hop_name, {})
+            )
+            for hop_name in hop_names
+        }
+    }
+
+
+def refresh_registry() -> dict:
+    """Bring the registry up to date with the data directory, then save it.
+
+    :return: The registry.
+    """
+    global _registry, _registry_stamp
+
+    with _registry_lock:
+        # Start from the saved index when another process changed it.
+        stamp = get_file_stamp(REGISTRY_PATH)
+        old = _registry if _registry is not None and \
+            stamp == _registry_stamp else _load_registry()
+        mtime = os.stat(DATA_PATH).st_mtime_ns
+
+        # A toad is a directory with a time table.
+        names = list(old.get("toads", {})) \
+            if mtime == old.get("mtime") else [
+                name for name in _list_directories(DATA_PATH)
+                if os.path.exists(f"{DATA_PATH}/{name}/time.csv")
+            ]
+
+        registry = {
+            "mtime": mtime,
+            "toads": {
+                name: _refresh_toad(
+                    name=name, old_toad=old.get("toads", {}).get(name, {})
+                )
+                for name in names
+            }
+        }
+
+        if registry != old:
+            _save_registry(registry=registry)
+        _registry = registry
+        _registry_stamp = get_file_stamp(REGISTRY_PATH)
+
+        return registry
+
+
+def _load_registry() -> dict:
+    """Load the saved registry, an empty one if it was never saved."""
+    try:
+        with open(REGISTRY_PATH) as registry_file:
+            return json.load(registry_file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_registry(registry: dict):
+    """Save the registry, replacing the old one at once.
+
+    :param registry: The registry to save.
+    """
+    os.makedirs(os.path.dirname(REGISTRY_PATH), exist_ok=True)
+    with open(f"{REGISTRY_PATH}.tmp", "w") as registry_file:
+        json.dump(registry, registry_file)
+    os.replace(f"{REGISTRY_PATH}.tmp", REGISTRY_PATH)
+
+
+def get_registry() -> dict:
+    """Get the registry, refreshing it the first time it is asked for and
+    whenever its index was saved by another process.
+    """
+    if _registry is not None and \
+            get_file_stamp(REGISTRY_PATH) == _registry_stamp:
+        return _registry
+
+    return refresh_registry()
+
+
+def get_registered_toad_hop(
+        tables: Sequence[str] = HOP_TABLES) -> Dict[str, List[int]]:
+    """Get every toad and its hop numbers.
+
+    :param tables: The tables a hop in the data directory needs to have.
+    :return: A dictionary where the key is toad and the item is the sorted
+        hop numbers, with the toads sorted by name.
+    """
+    registry = get_registry()
+
+    toad_hop = {
+        name: sorted(
+            int(hop_name) for hop_name, hop in toad["hops"].items()
+            if all(table in hop["tables"] for table in tables) and
+            int(hop_name) in toad["timed"]
+        )
+        for name, toad in registry["toads"].items()
+    }
+
+    return {name: toad_hop[name] for name in sorted(toad_hop)}
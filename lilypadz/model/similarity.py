@@ -0,0 +1,329 @@
+"""This file finds the hops whose curves are most like those of a given hop.
+
+The curves come from the hop tensor, with each variable of each hop scaled
+to a mean of 0 and a standard deviation of 1, so hops are compared by
+shape. The index keeps the upper and lower envelope of every hop within the
+warping window. The LB_Keogh bound computed from them is never more than
+the warping distance, so a hop whose bound is already larger than the k-th
+closest distance found is skipped without computing its distance.
+"""
+
+import numpy as np
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+from lilypadz.helper.cache import LRUCache
+from lilypadz.helper.constant import SIMILAR_HOPS, SIMILARITY_BATCH_SIZE, \
+    SIMILARITY_WINDOW
+from lilypadz.helper.metrics import span
+from lilypadz.model.hop_tensor import VARIABLES, get_hop_tensor
+
+
+class SimilarityIndex(NamedTuple):
+    """Scaled curves and their envelopes of every hop with all variables."""
+
+    # Values with the shape of (hop, time, variable).
+    values: np.ndarray
+    # Largest and smallest value within the window around each time point.
+    upper: np.ndarray
+    lower: np.ndarray
+    toad: np.ndarray
+    hop: np.ndarray
+    sight: np.ndarray
+
+
+class SimilarHop(NamedTuple):
+    """One hop found by a similarity search."""
+
+    toad: str
+    hop: int
+    sight: str
+    distance: float
+
+
+class SimilarityResult(NamedTuple):
+    """The most similar hops to a hop, closest first."""
+
+    hops: List[SimilarHop]
+    # Number of hops whose full distance was computed.
+    computed: int
+
+
+def scale_curves(values: np.ndarray) -> np.ndarray:
+    """Scale each variable of each hop to a mean of 0 and a standard
+    deviation of 1 over time, flat curves become 0.
+
+    :param values: Values with the shape of (hop, time, variable).
+    """
+    mean = values.mean(axis=1, keepdims=True)
+    std = values.std(axis=1, keepdims=True)
+
+    return np.divide(
+        values - mean, std, out=np.zeros_like(values), where=std > 0
+    )
+
+
+def get_envelope(values: np.ndarray,
+                 window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the largest and smallest value around each time point.
+
+    :param values: Values with the shape of (hop, time, variable).
+    :param window: Number of time points to look at on each side.
+    :return: The upper and lower envelope, of the same shape as the values.
+    """
+    # Repeating the ends does not change the largest or smallest value.
+    padded = np.pad(values, ((0, 0), (window, window), (0, 0)), mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(
+        padded, 2 * window + 1, axis=1
+    )
+
+    return windows.max(axis=-1), windows.min(axis=-1)
+
+
+def build_similarity_index(variable: Tuple[str, ...],
+                           window: int) -> SimilarityIndex:
+    """Index the scaled curves of every hop that has all the variables.
+
+    :param variable: Variable of interest.
+    :param window: Number of time points the warping may shift.
+    """
+    tensor = get_hop_tensor()
+    tensor = tensor.select(
+        names=list(dict.fromkeys(tensor.toad)), variable=list(variable)
+    )
+
+    # Hops without data for a variable can not be compared.
+    rows = ~np.isnan(tensor.values).any(axis=(1, 2))
+    values = scale_curves(values=tensor.values[rows])
+    upper, lower = get_envelope(values=values, window=window)
+
+    return SimilarityIndex(
+        values=values,
+        upper=upper,
+        lower=lower,
+        toad=tensor.toad[rows],
+        hop=tensor.hop[rows],
+        sight=tensor.sight[rows]
+    )
+
+
+# Similarity indices keyed by the variables, the window and the data version.
+SIMILARITY_INDEX_CACHE = LRUCache(max_size=8)
+
+
+def get_similarity_index(variable: List[str],
+                         window: int = SIMILARITY_WINDOW) -> SimilarityIndex:
+    """Get the similarity index, rebuilding it when the hop tensor changed.
+
+    :param variable: Variable of interest.
+    :param window: Number of time points the warping may shift.
+    """
+    variable = tuple(sorted(variable))
+
+    return SIMILARITY_INDEX_CACHE.get(
+        key=(variable, window, get_hop_tensor().version),
+        compute=lambda: build_similarity_index(
+            variable=variable, window=window
+        )
+    )
+
+
+def lb_keogh(query: np.ndarray,
+             upper: np.ndarray,
+             lower: np.ndarray) -> np.ndarray:
+    """Get the LB_Keogh lower bound of the squared warping distance between
+    a query and many hops.
+
+    :param query: The query with the shape of (time, variable).
+    :param upper: Upper envelopes with the shape of (hop, time, variable).
+    :param lower: Lower envelopes with the shape of (hop, time, variable).
+    :return: The bound for each hop.
+    """
+    above = np.maximum(query - upper, 0)
+    below = np.maximum(lower - query, 0)
+
+    return (above ** 2 + below ** 2).sum(axis=(1, 2))
+
+
+@lru_cache(maxsize=8)
+def _get_diagonals(length: int,
+                   window: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Get the cells of each anti-diagonal of the warping matrix that are
+    within the window, the cells of one only depend on earlier ones.
+
+    :param length: Number of time points of the curves.
+    :param window: Number of time points the warping may shift.
+    :return: The row and column of the cells of each anti-diagonal, counted
+        from 1 as the first row and column hold the start.
+    """
+    diagonals = []
+    for total in range(2, 2 * length + 1):
+        row = np.arange(max(1, total - length), min(length, total - 1) + 1)
+        column = total - row
+        inside = np.abs(row - column) <= window
+        diagonals.append((row[inside], column[inside]))
+
+    return diagonals
+
+
+def dtw_distance(query: np.ndarray,
+                 curves: np.ndarray,
+                 window: int) -> np.ndarray:
+    """Get the squared dynamic time warping distance between a query and
+    many hops, with the warping limited to a window.
+
+    :param query: The query with the shape of (time, variable).
+    :param curves: The hops with the shape of (hop, time, variable).
+    :param window: Number of time points the warping may shift.
+    :return: The distance for each hop.
+    """
+    length = len(query)
+
+    # Squared distance between every time point of the query and of a hop.
+    cost = ((
+        query[np.newaxis, :, np.newaxis, :] - curves[:, np.newaxis, :, :]
+    ) ** 2).sum(axis=-1)
+
+    total = np.full((len(curves), length + 1, length + 1), np.inf)
+    total[:, 0, 0] = 0
+
+    # Fill one anti-diagonal of every hop at a time.
+    for row, column in _get_diagonals(length=length, window=window):
+        total[:, row, column] = cost[:, row - 1, column - 1] + np.minimum(
+            np.minimum(
+                total[:, row - 1, column - 1], total[:, row - 1, column]
+            ),
+            total[:, row, column - 1]
+        )
+
+    return total[:, length, length]
+
+
+def euclidean_distance(query: np.ndarray, curves: np.ndarray) -> np.ndarray:
+    """Get the squared Euclidean distance between a query and many hops.
+
+    :param query: The query with the shape of (time, variable).
+    :param curves: The hops with the shape of (hop, time, variable).
+    :return: The distance for each hop.
+    """
+    return ((curves - query) ** 2).sum(axis=(1, 2))
+
+
+def search_euclidean(query: np.ndarray,
+                     index: SimilarityIndex,
+                     candidates: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Get the Euclidean distance to every candidate at once.
+
+    :param query: The query with the shape of (time, variable).
+    :param index: The similarity index.
+    :param candidates: The rows of the hops to compare with.
+    :return: The squared distance to each candidate and the number computed.
+    """
+    return euclidean_distance(
+        query=query, curves=index.values[candidates]
+    ), len(candidates)
+
+
+def search_dtw(query: np.ndarray,
+               index: SimilarityIndex,
+               candidates: np.ndarray,
+               k: int,
+               window: int) -> Tuple[np.ndarray, int]:
+    """Get the warping distance to the candidates that may be among the k
+    closest, in batches from the smallest lower bound.
+
+    :param query: The query with the shape of (time, variable).
+    :param index: The similarity index.
+    :param candidates: The rows of the hops to compare with.
+    :param k: Number of closest hops to find.
+    :param window: Number of time points the warping may shift.
+    :return: The squared distance to each candidate, infinite for the ones
+        skipped, and the number computed.
+    """
+    bound = lb_keogh(
+        query=query,
+        upper=index.upper[candidates],
+        lower=index.lower[candidates]
+    )
+    order = np.argsort(bound, kind="stable")
+    distance = np.full(len(candidates), np.inf)
+
+    computed = 0
+    while computed < len(order):
+        # The rest can not beat the k-th closest distance found so far.
+        if computed >= k and \
+                bound[order[computed]] >= np.partition(distance, k - 1)[k - 1]:
+            break
+
+        batch = order[computed:computed + SIMILARITY_BATCH_SIZE]
+        distance[batch] = dtw_distance(
+            query=query, curves=index.values[candidates[batch]],
+            window=window
+        )
+        computed += len(batch)
+
+    return distance, computed
+
+
+# Ways to measure how far two hops are, selectable by the request.
+SIMILARITY_METRICS = ("euclidean", "dtw")
+
+
+def find_similar_hops(name: str,
+                      hop: int,
+                      variable: List[str],
+                      k: int = SIMILAR_HOPS,
+                      metric: str = "euclidean",
+                      window: int = SIMILARITY_WINDOW) -> SimilarityResult:
+    """Find the hops whose curves are closest to those of one hop.
+
+    :param name: The toad of the hop to compare with.
+    :param hop: The hop number of the hop to compare with.
+    :param variable: Variable of interest.
+    :param k: Number of closest hops to find.
+    :param metric: How to measure the distance, one of SIMILARITY_METRICS.
+    :param window: Number of time points the warping may shift.
+    :return: The closest hops, closest first, without the hop itself.
+    """
+    if metric not in SIMILARITY_METRICS:
+        raise ValueError(f"Unknown similarity metric {metric}.")
+    if k < 1:
+        raise ValueError("The number of hops must be at least 1.")
+    for column in variable:
+        if column not in VARIABLES:
+            raise ValueError(f"Unknown variable {column}.")
+
+    with span("similarity_search"):
+        index = get_similarity_index(variable=variable, window=window)
+
+        row = np.flatnonzero((index.toad == name) & (index.hop == hop))
+        if len(row) == 0:
+            raise ValueError(f"{name} hop {hop} has no data to compare.")
+
+        query = index.values[row[0]]
+        candidates = np.flatnonzero(np.arange(len(index.hop)) != row[0])
+
+        if metric == "euclidean":
+            distance, computed = search_euclidean(
+                query=query, index=index, candidates=candidates
+            )
+        else:
+            distance, computed = search_dtw(
+                query=query, index=index, candidates=candidates, k=k,
+                window=window
+            )
+
+        closest = np.argsort(distance, kind="stable")[:k]
+        closest = closest[np.isfinite(distance[closest])]
+
+    return SimilarityResult(
+        hops=[
+            SimilarHop(
+                toad=str(index.toad[candidates[position]]),
+                hop=int(index.hop[candidates[position]]),
+                sight=str(index.sight[candidates[position]]),
+                distance=float(np.sqrt(distance[position]))
+            )
+            for position in closest
+        ],
+        computed=computed
+    )
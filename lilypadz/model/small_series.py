@@ -1,389 +1,526 @@
+import json
+import zlib
+import base64
+import warnings
 import colorlover
-from typing import List
+import numpy as np
 from random import sample
 import plotly.graph_objs as go
+from flask import jsonify
+from functools import lru_cache
 from plotly.offline import plot
 from plotly.tools import make_subplots
-from lilypadz.helper.constant import TOAD_COLOR, SIGHT_BLIND_COLOR
-from lilypadz.model.data_processor import get_toad_processed_hop
+from plotly.utils import PlotlyJSONEncoder
+from typing import Dict, List, NamedTuple, Tuple
+from lilypadz.helper.constant import TOAD_COLOR, SIGHT_BLIND_COLOR, \
+    KINEMATIC_VARIABLES, FORCE_PLATE_VARIABLES, BAND_PERCENTILES
+from lilypadz.helper.metrics import span
+from lilypadz.model.hop_tensor import HopTensor, get_hop_tensor
+from lilypadz.model.registry import get_registered_toad_hop
+from lilypadz.model.downsample import downsample_traces
 
 
-def get_ss_for_one_toad(name: str, variable: List[str]):
-    """Get small series plot for one specific toad.
+class HopSeries(NamedTuple):
+    """Data structure of one hop drawn in a small series plot."""
 
-    :param name: The name of the desired toad.
-    :param variable: Variable of interest.
-    :return: Two plots, the kinematic and force plate small series.
-    """
-    # Get the processed hop data.
-    processed_hop = get_toad_processed_hop(name=name)
+    name: str
+    legendgroup: str
+    color: str
+    toad: str
+    hop: int
 
-    # Set the global color to use.
-    color = colorlover.to_rgb(
-        colorlover.interp(
-            colorlover.scales["11"]["qual"]["Paired"], len(processed_hop)
-        )
-    )
 
-    # Get the force plate column names.
-    fp_variables = list(
-        {"Fore-Aft", "Lateral", "Normal"}.intersection(variable)
-    )
+class SmallSeriesTemplate(NamedTuple):
+    """Data structure of the subplot layout for one set of variables."""
 
-    # Get the kinematic column names.
-    kinematic_variables = list(
-        {"Elbow flexion/extension",
-         "Humeral protraction/retraction",
-         "Humeral depression/elevation"}.intersection(variable)
-    )
+    # Variable shown in each row, kinematic ones first.
+    rows: Tuple[str, ...]
+    # Layout of the plot as plain JSON data.
+    layout: dict
+    # The x and y axis of each row.
+    axes: Tuple[Tuple[str, str], ...]
+    # The row that shows the legend of each hop.
+    legend_row: int
 
-    # Create the subplot for force plate plot.
+
+@lru_cache(maxsize=64)
+def get_small_series_template(
+        variable: Tuple[str, ...]) -> SmallSeriesTemplate:
+    """Get the subplot layout of a small series plot, built once for each
+    combination of variables.
+
+    :param variable: Variable of interest.
+    :return: The rows, layout, axes and legend row of the plot.
+    """
+    # Get the kinematic and force plate variables, in a fixed order.
+    kinematic_variables = [
+        column for column in KINEMATIC_VARIABLES if column in variable
+    ]
+    fp_variables = [
+        column for column in FORCE_PLATE_VARIABLES if column in variable
+    ]
+    rows = tuple(kinematic_variables + fp_variables)
+
+    # Create the subplot for all variables.
     small_series = make_subplots(
         cols=1,
         shared_xaxes=True,
-        rows=len(variable),
-        subplot_titles=variable
+        rows=len(rows),
+        subplot_titles=rows,
+        print_grid=False
     )
-    # Iterate over processed data for each hop.
-    for index, (toad_hop, hop_data) in enumerate(processed_hop.items()):
-        for col_index, col_name in enumerate(kinematic_variables):
-            # Append trace to the subplot.
-            small_series.append_trace(
-                col=1, row=col_index + 1,
-                trace=go.Scatter(
-                    x=hop_data.kinematic.index,
-                    y=hop_data.kinematic[col_name],
-                    mode='lines',
-                    name=toad_hop,
-                    legendgroup=toad_hop,
-                    line=dict(color=color[index], shape="spline"),
-                    # Show the legend only for first trace.
-                    showlegend=True if col_index == 0 and len(
-                        fp_variables) == 0 else False
-                )
-            )
 
-        # Iterate over each column within the hop data.
-        for col_index, col_name in enumerate(fp_variables):
-            # Append trace to the subplot.
-            small_series.append_trace(
-                col=1, row=col_index + 1 + len(kinematic_variables),
-                trace=go.Scatter(
-                    x=hop_data.force_plate.index,
-                    y=hop_data.force_plate[col_name],
-                    mode="lines",
-                    name=toad_hop,
-                    showlegend=True if col_index == 0 else False,
-                    legendgroup=toad_hop,
-                    line=dict(color=color[index], shape="spline")
-                )
-            )
+    # Find the axes of each row from one empty trace per row.
+    small_series.add_traces(
+        [go.Scatter() for _ in rows],
+        rows=list(range(1, len(rows) + 1)),
+        cols=[1] * len(rows)
+    )
+    axes = tuple((trace.xaxis, trace.yaxis) for trace in small_series.data)
 
     # Adjust the settings of the plot.
     small_series["layout"].update(
         height=825, margin={"l": 40, "r": 40, "b": 30, "t": 40},
         xaxis=dict(title='Time(0.1s)'),
-        yaxis=dict(title='Angle (degrees)'),
-        yaxis2=dict(title='Angle (degrees)'),
-        yaxis3=dict(title='Angle (degrees)'),
-        yaxis4=dict(title='Newtons'),
-        yaxis5=dict(title='Newtons'),
-        yaxis6=dict(title='Newtons')
+        **{
+            f"yaxis{y_axis[1:]}": dict(
+                title='Angle (degrees)' if column in KINEMATIC_VARIABLES
+                else 'Newtons'
+            )
+            for column, (_, y_axis) in zip(rows, axes)
+        }
     )
 
-    return plot(
-        small_series,
-        show_link=False,
-        output_type="div",
-        include_plotlyjs=False
+    return SmallSeriesTemplate(
+        rows=rows,
+        layout=json.loads(
+            json.dumps(small_series.layout, cls=PlotlyJSONEncoder)
+        ),
+        axes=axes,
+        # Show the legend in the first force plate row if there is one.
+        legend_row=len(kinematic_variables) if fp_variables else 0
     )
 
 
-def get_ss_for_multiple_toads(names: List[str], variable: List[str]):
-    """Get small series plot for one specific toad.
+def get_tensor_rows(hop_series: List[HopSeries],
+                    tensor: HopTensor) -> np.ndarray:
+    """Find the row of each hop to draw in the hop tensor.
 
-    :param names: Names of the desired toads.
-    :param variable: Variable of interest.
-    :return: The small series plot.
+    :param hop_series: The hops to draw.
+    :param tensor: The hop tensor selected for the toads of the plot.
+    :return: The row of each hop, in the same order.
     """
-    # Get the force plate column names.
-    fp_variables = list(
-        {"Fore-Aft", "Lateral", "Normal"}.intersection(variable)
-    )
+    tensor_row = {
+        (toad, hop): index
+        for index, (toad, hop) in enumerate(zip(tensor.toad, tensor.hop))
+    }
+
+    return np.array([
+        tensor_row[(series.toad, series.hop)] for series in hop_series
+    ], dtype=int)
+
+
+def get_traces(hop_series: List[HopSeries],
+               template: SmallSeriesTemplate,
+               tensor: HopTensor) -> List[dict]:
+    """Build the trace of every hop and variable of a small series plot.
+
+    :param hop_series: The hops to draw.
+    :param template: The subplot layout of the plot.
+    :param tensor: The hop tensor selected for the toads and variables of
+        the plot, so its columns follow the rows of the plot.
+    :return: Every trace as plain data, ready for plotly.
+    """
+    traces = []
+
+    # Iterate over the recorded frames for each hop.
+    for series, index in zip(hop_series,
+                             get_tensor_rows(hop_series=hop_series,
+                                             tensor=tensor)):
+        # Iterate over each row, the kinematic ones come first.
+        for row, (x_axis, y_axis) in enumerate(template.axes):
+            length = tensor.lengths[index, row]
+
+            traces.append(dict(
+                type="scatter",
+                mode="lines",
+                x=np.arange(length),
+                y=tensor.frames[index, :length, row],
+                name=series.name,
+                legendgroup=series.legendgroup,
+                # Show the legend only for one trace of each hop.
+                showlegend=row == template.legend_row,
+                line=dict(color=series.color, shape="spline"),
+                xaxis=x_axis,
+                yaxis=y_axis
+            ))
+
+    return traces
+
+
+def get_toad_color(name: str) -> List[str]:
+    """Get the color scale of a toad, toads without one share the scales.
+
+    :param name: The toad of interest.
+    """
+    if name in TOAD_COLOR:
+        return TOAD_COLOR[name]
 
-    # Get the kinematic column names.
-    kinematic_variables = list(
-        {"Elbow flexion/extension",
-         "Humeral protraction/retraction",
-         "Humeral depression/elevation"}.intersection(variable)
-    )
+    # The checksum keeps the scale of a toad the same in every process.
+    scales = list(TOAD_COLOR.values())
+    return scales[zlib.crc32(name.encode()) % len(scales)]
 
-    # Create the subplot for force plate plot.
-    small_series = make_subplots(
-        cols=1,
-        shared_xaxes=True,
-        rows=len(variable),
-        subplot_titles=variable
-    )
 
-    for name in names:
-        # Get the processed hop data.
-        processed_hop = get_toad_processed_hop(name=name)
-        # Random select five samples.
-        random_sample = sample(processed_hop.keys(), 5)
-        processed_hop = {
-            sample_hop: processed_hop[sample_hop]
-            for sample_hop in random_sample
-        }
+def get_fill_color(color: str, opacity: float = 0.3) -> str:
+    """Make a translucent version of an "rgb(r, g, b)" color.
 
-        # Iterate over processed data for each hop.
-        for index, (toad_hop, hop_data) in enumerate(processed_hop.items()):
-            # Iterate over each column within the hop data.
-            for col_index, col_name in enumerate(kinematic_variables):
-                # Append trace to the subplot.
-                small_series.append_trace(
-                    col=1, row=col_index + 1,
-                    trace=go.Scatter(
-                        x=hop_data.kinematic.index,
-                        y=hop_data.kinematic[col_name],
-                        mode="lines",
-                        name=toad_hop,
-                        legendgroup=name,
-                        line=dict(
-                            color=TOAD_COLOR[name][6 - index],
-                            shape="spline"
-                        ),
-                        # Show the legend only for first trace.
-                        showlegend=True if col_index == 0 and len(
-                            fp_variables) == 0 else False
-                    )
-                )
+    :param color: The color of interest.
+    :param opacity: Opacity of the new color.
+    :return: The color as "rgba(r, g, b, opacity)".
+    """
+    return f"rgba({color[color.index('(') + 1:-1]}, {opacity})"
 
-            # Iterate over each column within the hop data.
-            for col_index, col_name in enumerate(fp_variables):
-                # Append trace to the subplot.
-                small_series.append_trace(
-                    col=1, row=col_index + len(kinematic_variables) + 1,
-                    trace=go.Scatter(
-                        x=hop_data.force_plate.index,
-                        y=hop_data.force_plate[col_name],
-                        mode='lines',
-                        name=toad_hop,
-                        showlegend=True if col_index == 0 else False,
-                        legendgroup=name,
-                        line=dict(
-                            color=TOAD_COLOR[name][6 - index],
-                            shape="spline"
-                        )
-                    )
+
+def get_band_traces(hop_series: List[HopSeries],
+                    template: SmallSeriesTemplate,
+                    tensor: HopTensor,
+                    band: str) -> List[dict]:
+    """Build the mean and spread over time of every group of hops.
+
+    The hops of each row are stacked into one array of (group, hop, time), so
+    the statistics of all groups come from a single call.
+
+    :param hop_series: The hops to aggregate, grouped by their legend group.
+    :param template: The subplot layout of the plot.
+    :param tensor: The hop tensor selected for the toads and variables of
+        the plot, so its columns follow the rows of the plot.
+    :param band: "std" for the mean plus and minus one standard deviation, or
+        "percentile" for the range between BAND_PERCENTILES.
+    :return: A lower bound, upper bound and mean trace per group and row.
+    """
+    # The bands are taken over the recorded frames of the hops.
+    rows = get_tensor_rows(hop_series=hop_series, tensor=tensor)
+
+    # Number the groups and the hops within each group.
+    groups = {}
+    for series in hop_series:
+        groups.setdefault(series.legendgroup, []).append(series)
+    group_index = np.array([
+        list(groups).index(series.legendgroup) for series in hop_series
+    ], dtype=int)
+    hop_index = np.array([
+        groups[series.legendgroup].index(series) for series in hop_series
+    ], dtype=int)
+
+    traces = []
+
+    # Iterate over each row, the kinematic ones come first.
+    for row, (x_axis, y_axis) in enumerate(template.axes):
+        stacked = tensor.frames[rows, :, row]
+        grouped = np.full(
+            (len(groups), hop_index.max(initial=0) + 1, stacked.shape[1]),
+            np.nan
+        )
+        grouped[group_index, hop_index] = stacked
+
+        # Times no hop of a group reaches are left as NaN.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean = np.nanmean(grouped, axis=1)
+            if band == "std":
+                spread = np.nanstd(grouped, axis=1)
+                lower, upper = mean - spread, mean + spread
+            else:
+                lower, upper = np.nanpercentile(
+                    grouped, BAND_PERCENTILES, axis=1
                 )
 
-    # Adjust the settings of the plot.
-    small_series["layout"].update(
-        height=825, margin={"l": 40, "r": 40, "b": 30, "t": 40},
-        xaxis=dict(title='Time(0.1s)'),
-        yaxis=dict(title='Angle (degrees)'),
-        yaxis2=dict(title='Angle (degrees)'),
-        yaxis3=dict(title='Angle (degrees)'),
-        yaxis4=dict(title='Newtons'),
-        yaxis5=dict(title='Newtons'),
-        yaxis6=dict(title='Newtons')
-    )
+        for index, (group, members) in enumerate(groups.items()):
+            # Drop the times after the longest hop of the group.
+            length = np.flatnonzero(~np.isnan(mean[index]))[-1:] + 1
+            x_value = np.arange(length[0] if length.size else 0)
+            color = members[0].color
+            common = dict(
+                type="scatter", mode="lines", x=x_value,
+                legendgroup=group, xaxis=x_axis, yaxis=y_axis
+            )
+
+            traces.extend([
+                dict(common, y=lower[index, :len(x_value)],
+                     name=f"{group} {band}", showlegend=False,
+                     hoverinfo="skip", line=dict(color=color, width=0)),
+                # Fill the area between the lower and upper bounds.
+                dict(common, y=upper[index, :len(x_value)],
+                     name=f"{group} {band}", showlegend=False,
+                     hoverinfo="skip", line=dict(color=color, width=0),
+                     fill="tonexty", fillcolor=get_fill_color(color)),
+                dict(common, y=mean[index, :len(x_value)],
+                     name=f"{group} ({len(members)} hops)",
+                     # Show the legend only for one trace of each group.
+                     showlegend=row == template.legend_row,
+                     line=dict(color=color, shape="spline"))
+            ])
+
+    return traces
+
+
+def encode_array(values) -> str:
+    """Encode numbers as base64 of little endian 32 bit floats.
+
+    :param values: The numbers to encode.
+    :return: The base64 string, decoded by the front end to a Float32Array.
+    """
+    return base64.b64encode(
+        np.asarray(values, dtype="<f4").tobytes()
+    ).decode("ascii")
+
 
-    return plot(
-        small_series,
-        show_link=False,
-        output_type="div",
-        include_plotlyjs=False
+def get_trace_payload(traces: List[dict], layout: dict) -> dict:
+    """Get the numeric series and minimal metadata of a small series plot.
+
+    :param traces: Every trace of the plot.
+    :param layout: Layout of the plot.
+    :return: The layout and every trace, whose values are base64 encoded and
+        whose x values are left out when they are the sample indices.
+    """
+    return dict(
+        layout=layout,
+        traces=[
+            dict(
+                trace,
+                y=encode_array(trace["y"]),
+                # Plotly uses the indices when x is not given.
+                x=None if np.array_equal(
+                    trace["x"], np.arange(len(trace["y"]))
+                ) else encode_array(trace["x"])
+            )
+            for trace in traces
+        ]
     )
 
 
-def get_ss_for_one_toad_sight(name: str, variable: List[str]):
-    """Get small series plot for one specific toad.
+# Spreads that an aggregated small series can draw around the mean.
+AGGREGATE_BANDS = ("std", "percentile")
 
-    :param name: The name of the desired toad.
+
+def assemble_small_series(hop_series: List[HopSeries],
+                          tensor: HopTensor,
+                          variable: List[str],
+                          output: str = "html",
+                          max_points: int = None,
+                          aggregate: str = None):
+    """Assemble and render a small series plot from the hops to draw.
+
+    :param hop_series: The hops to draw.
+    :param tensor: The hop tensor selected for the toads and variables of
+        the plot.
     :param variable: Variable of interest.
-    :return: Two plots, the kinematic and force plate small series.
+    :param output: "html" for a plotly div, or "traces" for the compact
+        numeric traces that the front end draws itself.
+    :param max_points: Total number of points to draw, default to all.
+    :param aggregate: "std" or "percentile" to draw the mean and spread of
+        each legend group instead of every hop, default to every hop.
+    :return: The HTML string or the JSON response.
     """
-    # Get the processed hop data.
-    processed_hop = get_toad_processed_hop(name=name)
+    if aggregate is not None and aggregate not in AGGREGATE_BANDS:
+        raise ValueError(f"Unknown aggregate band {aggregate}.")
 
-    # Get the force plate column names.
-    fp_variables = list(
-        {"Fore-Aft", "Lateral", "Normal"}.intersection(variable)
-    )
+    with span("small_series_traces"):
+        template = get_small_series_template(
+            variable=tuple(sorted(variable))
+        )
 
-    # Get the kinematic column names.
-    kinematic_variables = list(
-        {"Elbow flexion/extension",
-         "Humeral protraction/retraction",
-         "Humeral depression/elevation"}.intersection(variable)
-    )
+        if aggregate is None:
+            traces = get_traces(
+                hop_series=hop_series, template=template, tensor=tensor
+            )
+        else:
+            traces = get_band_traces(
+                hop_series=hop_series, template=template, tensor=tensor,
+                band=aggregate
+            )
 
-    # Create the subplot for force plate plot.
-    small_series = make_subplots(
-        cols=1,
-        shared_xaxes=True,
-        rows=len(variable),
-        subplot_titles=variable
-    )
+        # Keep the shape of the traces within the budget of points.
+        if max_points is not None:
+            traces = downsample_traces(traces=traces, max_points=max_points)
 
-    # Iterate over processed data for each hop.
-    for index, (toad_hop, hop_data) in enumerate(processed_hop.items()):
-        # Iterate over each column within the hop data.
-        for col_index, col_name in enumerate(kinematic_variables):
-            # Append trace to the subplot.
-            small_series.append_trace(
-                col=1, row=col_index + 1,
-                trace=go.Scatter(
-                    x=hop_data.kinematic.index,
-                    y=hop_data.kinematic[col_name],
-                    mode="lines",
-                    name=f"{toad_hop} {hop_data.sight}",
-                    legendgroup=hop_data.sight,
-                    line=dict(
-                        color=SIGHT_BLIND_COLOR[hop_data.sight],
-                        shape="spline"
-                    ),
-                    # Show the legend only for first trace.
-                    showlegend=True if col_index == 0 and len(
-                        fp_variables) == 0 else False
-                )
+    with span("small_series_render"):
+        if output == "traces":
+            return jsonify(
+                get_trace_payload(traces=traces, layout=template.layout)
             )
 
-        # Iterate over each column within the hop data.
-        for col_index, col_name in enumerate(fp_variables):
-            # Append trace to the subplot.
-            small_series.append_trace(
-                col=1, row=col_index + len(kinematic_variables) + 1,
-                trace=go.Scatter(
-                    x=hop_data.force_plate.index,
-                    y=hop_data.force_plate[col_name],
-                    mode='lines',
-                    name=f"{toad_hop} {hop_data.sight}",
-                    showlegend=True if col_index == 0 else False,
-                    legendgroup=hop_data.sight,
-                    line=dict(
-                        color=SIGHT_BLIND_COLOR[hop_data.sight],
-                        shape="spline"
-                    )
-                )
-            )
+        # The traces are built from the template, so validating them is
+        # skipped.
+        return plot(
+            dict(data=traces, layout=template.layout),
+            show_link=False,
+            output_type="div",
+            include_plotlyjs=False,
+            validate=False
+        )
 
-    # Adjust the settings of the plot.
-    small_series["layout"].update(
-        height=825, margin={"l": 40, "r": 40, "b": 30, "t": 40},
-        xaxis=dict(title='Time(0.1s)'),
-        yaxis=dict(title='Angle (degrees)'),
-        yaxis2=dict(title='Angle (degrees)'),
-        yaxis3=dict(title='Angle (degrees)'),
-        yaxis4=dict(title='Newtons'),
-        yaxis5=dict(title='Newtons'),
-        yaxis6=dict(title='Newtons')
+
+def get_ss_for_one_toad(name: str,
+                        variable: List[str],
+                        output: str = "html",
+                        max_points: int = None):
+    """Get small series plot for one specific toad.
+
+    :param name: The name of the desired toad.
+    :param variable: Variable of interest.
+    :param output: "html" for a plotly div or "traces" for numeric traces.
+    :param max_points: Total number of points to draw, default to all.
+    :return: Two plots, the kinematic and force plate small series.
+    """
+    # Get the resampled hops of the toad.
+    tensor = get_hop_tensor().select(names=[name], variable=variable)
+
+    # Set the global color to use.
+    color = colorlover.to_rgb(
+        colorlover.interp(
+            colorlover.scales["11"]["qual"]["Paired"], len(tensor.hop)
+        )
     )
 
-    return plot(
-        small_series,
-        show_link=False,
-        output_type="div",
-        include_plotlyjs=False
+    return assemble_small_series(
+        hop_series=[
+            HopSeries(name=f"{name} hop {hop}",
+                      legendgroup=f"{name} hop {hop}",
+                      color=color[index], toad=name, hop=int(hop))
+            for index, hop in enumerate(tensor.hop)
+        ],
+        tensor=tensor,
+        variable=variable,
+        output=output,
+        max_points=max_points
     )
 
 
-def get_ss_for_multiple_toads_sight(names: List[str], variable: List[str]):
+def get_sample_hops(names: List[str]) -> Dict[str, List[int]]:
+    """Get five random hops of some toads, or every hop of a toad with
+    fewer.
+
+    :param names: Names of the desired toads.
+    :return: A dictionary where the key is toad and the item is the sampled
+        hop numbers.
+    """
+    # Random select five samples of each toad.
+    toad_hop = get_registered_toad_hop()
+    return {
+        name: sample(toad_hop[name], min(5, len(toad_hop[name])))
+        for name in names
+    }
+
+
+def get_ss_for_multiple_toads(names: List[str],
+                              variable: List[str],
+                              output: str = "html",
+                              max_points: int = None,
+                              aggregate: str = None):
     """Get small series plot for one specific toad.
 
     :param names: Names of the desired toads.
     :param variable: Variable of interest.
+    :param output: "html" for a plotly div or "traces" for numeric traces.
+    :param max_points: Total number of points to draw, default to all.
+    :param aggregate: "std" or "percentile" to draw the mean and spread of
+        each toad, default to five random hops of each toad.
     :return: The small series plot.
     """
-    # Get the force plate column names.
-    fp_variables = list(
-        {"Fore-Aft", "Lateral", "Normal"}.intersection(variable)
+    tensor = get_hop_tensor().select(names=names, variable=variable)
+
+    # Aggregate every hop, or draw five random hops of each toad.
+    toad_hop = get_sample_hops(names=names) \
+        if aggregate is None else get_registered_toad_hop()
+
+    return assemble_small_series(
+        hop_series=[
+            HopSeries(name=f"{name} hop {hop}", legendgroup=name,
+                      color=get_toad_color(name=name)[max(6 - index, 0)],
+                      toad=name, hop=hop)
+            for name in names
+            for index, hop in enumerate(toad_hop[name])
+        ],
+        tensor=tensor,
+        variable=variable,
+        output=output,
+        max_points=max_points,
+        aggregate=aggregate
     )
 
-    # Get the kinematic column names.
-    kinematic_variables = list(
-        {"Elbow flexion/extension",
-         "Humeral protraction/retraction",
-         "Humeral depression/elevation"}.intersection(variable)
-    )
 
-    # Create the subplot for force plate plot.
-    small_series = make_subplots(
-        cols=1,
-        shared_xaxes=True,
-        rows=len(variable),
-        subplot_titles=variable
-    )
-
-    for name in names:
-        # Get the processed hop data.
-        processed_hop = get_toad_processed_hop(name=name)
-        # Random select five samples.
-        random_sample = sample(processed_hop.keys(), 5)
-        processed_hop = {
-            sample_hop: processed_hop[sample_hop]
-            for sample_hop in random_sample
-        }
+def get_ss_for_one_toad_sight(name: str,
+                              variable: List[str],
+                              output: str = "html",
+                              max_points: int = None,
+                              aggregate: str = None):
+    """Get small series plot for one specific toad.
 
-        # Iterate over processed data for each hop.
-        for index, (toad_hop, hop_data) in enumerate(processed_hop.items()):
-            # Iterate over each column within the hop data.
-            for col_index, col_name in enumerate(kinematic_variables):
-                # Append trace to the subplot.
-                small_series.append_trace(
-                    col=1, row=col_index + 1,
-                    trace=go.Scatter(
-                        x=hop_data.kinematic.index,
-                        y=hop_data.kinematic[col_name],
-                        mode="lines",
-                        name=f"{toad_hop} {hop_data.sight}",
-                        legendgroup=hop_data.sight,
-                        line=dict(
-                            color=SIGHT_BLIND_COLOR[hop_data.sight],
-                            shape="spline"
-                        ),
-                        # Show the legend only for first trace.
-                        showlegend=True if col_index == 0 and len(
-                            fp_variables) == 0 else False
-                    )
-                )
+    :param name: The name of the desired toad.
+    :param variable: Variable of interest.
+    :param output: "html" for a plotly div or "traces" for numeric traces.
+    :param max_points: Total number of points to draw, default to all.
+    :param aggregate: "std" or "percentile" to draw the mean and spread of
+        the sighted and blind hops, default to every hop.
+    :return: Two plots, the kinematic and force plate small series.
+    """
+    tensor = get_hop_tensor().select(names=[name], variable=variable)
+
+    return assemble_small_series(
+        hop_series=[
+            HopSeries(name=f"{name} hop {hop} {sight}",
+                      legendgroup=sight,
+                      color=SIGHT_BLIND_COLOR[sight],
+                      toad=name, hop=int(hop))
+            for hop, sight in zip(tensor.hop, tensor.sight)
+        ],
+        tensor=tensor,
+        variable=variable,
+        output=output,
+        max_points=max_points,
+        aggregate=aggregate
+    )
 
-            # Iterate over each column within the hop data.
-            for col_index, col_name in enumerate(fp_variables):
-                # Append trace to the subplot.
-                small_series.append_trace(
-                    col=1, row=col_index + len(kinematic_variables) + 1,
-                    trace=go.Scatter(
-                        x=hop_data.force_plate.index,
-                        y=hop_data.force_plate[col_name],
-                        mode='lines',
-                        name=f"{toad_hop} {hop_data.sight}",
-                        showlegend=True if col_index == 0 else False,
-                        legendgroup=hop_data.sight,
-                        line=dict(
-                            color=SIGHT_BLIND_COLOR[hop_data.sight],
-                            shape="spline"
-                        )
-                    )
-                )
 
-    # Adjust the settings of the plot.
-    small_series["layout"].update(
-        height=825, margin={"l": 40, "r": 40, "b": 30, "t": 40},
-        xaxis=dict(title='Time(0.1s)'),
-        yaxis=dict(title='Angle (degrees)'),
-        yaxis2=dict(title='Angle (degrees)'),
-        yaxis3=dict(title='Angle (degrees)'),
-        yaxis4=dict(title='Newtons'),
-        yaxis5=dict(title='Newtons'),
-        yaxis6=dict(title='Newtons')
-    )
+def get_ss_for_multiple_toads_sight(names: List[str],
+                                    variable: List[str],
+                                    output: str = "html",
+                                    max_points: int = None,
+                                    aggregate: str = None):
+    """Get small series plot for one specific toad.
 
-    return plot(
-        small_series,
-        show_link=False,
-        output_type="div",
-        include_plotlyjs=False
+    :param names: Names of the desired toads.
+    :param variable: Variable of interest.
+    :param output: "html" for a plotly div or "traces" for numeric traces.
+    :param max_points: Total number of points to draw, default to all.
+    :param aggregate: "std" or "percentile" to draw the mean and spread of
+        the sighted and blind hops, default to five random hops of
+        each toad.
+    :return: The small series plot.
+    """
+    tensor = get_hop_tensor().select(names=names, variable=variable)
+    sight = {
+        (toad, hop): hop_sight
+        for toad, hop, hop_sight in zip(tensor.toad, tensor.hop, tensor.sight)
+    }
+
+    # Aggregate every hop, or draw five random hops of each toad.
+    toad_hop = get_sample_hops(names=names) \
+        if aggregate is None else get_registered_toad_hop()
+
+    return assemble_small_series(
+        hop_series=[
+            HopSeries(name=f"{name} hop {hop} {sight[(name, hop)]}",
+                      legendgroup=sight[(name, hop)],
+                      color=SIGHT_BLIND_COLOR[sight[(name, hop)]],
+                      toad=name, hop=hop)
+            for name in names
+            for hop in toad_hop[name]
+        ],
+        tensor=tensor,
+        variable=variable,
+        output=output,
+        max_points=max_points,
+        aggregate=aggregate
     )
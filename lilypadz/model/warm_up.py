@@ -0,0 +1,78 @@
+"""This file warms up the caches in the background after the app starts."""
+
+from threading import Lock, Thread
+from typing import NamedTuple
+from lilypadz.model.data_processor import get_toad_processed_hop
+from lilypadz.model.hop_tensor import get_hop_tensor
+from lilypadz.model.registry import get_registered_toad_hop
+
+
+class WarmUpProgress(NamedTuple):
+    """Progress of the warm up."""
+
+    started: bool
+    # Number of hops loaded and processed so far.
+    done: int
+    total: int
+    # Whether every hop and the hop tensor are ready.
+    ready: bool
+    error: str = None
+
+
+_warm_up_lock = Lock()
+_warm_up_progress = WarmUpProgress(
+    started=False,
+    done=0,
+    total=0,
+    ready=False
+)
+
+
+def _update_progress(**changes):
+    """Change some fields of the warm up progress."""
+    global _warm_up_progress
+
+    with _warm_up_lock:
+        _warm_up_progress = _warm_up_progress._replace(**changes)
+
+
+def warm_up():
+    """Load and process every hop of every toad, then build the hop tensor
+    that the features, small series and similarity search are read from."""
+    try:
+        toad_hop = get_registered_toad_hop()
+        _update_progress(total=sum(len(hops) for hops in toad_hop.values()))
+
+        for name, hops in toad_hop.items():
+            get_toad_processed_hop(name=name)
+            _update_progress(done=get_warm_up_progress().done + len(hops))
+
+        get_hop_tensor()
+        _update_progress(ready=True)
+
+    # The app still works when cold, so the error is only reported.
+    except Exception as error:
+        _update_progress(error=repr(error))
+
+
+def start_warm_up() -> bool:
+    """Start the warm up in a background thread, once per process.
+
+    :return: True if the warm up was started by this call.
+    """
+    global _warm_up_progress
+
+    with _warm_up_lock:
+        if _warm_up_progress.started:
+            return False
+        _warm_up_progress = _warm_up_progress._replace(started=True)
+
+    Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+    return True
+
+
+def get_warm_up_progress() -> WarmUpProgress:
+    """Get the progress of the warm up."""
+    with _warm_up_lock:
+        return _warm_up_progress
@@ -43,10 +43,45 @@ function getOption() {
 		),
 		variable: Array.prototype.join.call(
 			$("#variable").val(), "!"
-		)
+		),
+		// Ask for numeric traces, the plot is drawn in the browser.
+		output: "traces"
 	})
 }
 
+/**
+ * Decode a base64 string of little endian 32 bit floats.
+ * @param {string} encoded The base64 string sent by the backend.
+ * @returns {Float32Array} The decoded numbers.
+ */
+function decodeArray(encoded) {
+	const binary = atob(encoded)
+	const bytes = new Uint8Array(binary.length)
+	for (let index = 0; index < binary.length; index++) {
+		bytes[index] = binary.charCodeAt(index)
+	}
+	return new Float32Array(bytes.buffer)
+}
+
+/**
+ * Draw the small series plot from the numeric traces.
+ * @param {Object} payload The layout and traces sent by the backend.
+ */
+function drawSmallSeries(payload) {
+	const traces = payload["traces"].map(trace => {
+		const data = Object.assign({}, trace, {y: decodeArray(trace["y"])})
+		// Without x, plotly uses the sample indices.
+		if (trace["x"] === null) delete data["x"]
+		else data["x"] = decodeArray(trace["x"])
+		return data
+	})
+
+	// Draw the plot in a new div within the holder.
+	const plotDiv = $("<div>")
+	$("#vis-holder-one").append(plotDiv)
+	Plotly.newPlot(plotDiv[0], traces, payload["layout"], {showLink: false})
+}
+
 function convertToDataTable(table) {
 	table.DataTable({
 		// Do not paging.
@@ -163,7 +198,7 @@ function upload() {
 				type: "green",
 				icon: "fas fa-check-circle",
 				theme: "modern",
-				title: "File uploaded!",
+				title: "Hop uploaded!",
 				content: "",
 				buttons: {
 					confirm: {
@@ -173,13 +208,14 @@ function upload() {
 				}
 			})
 		})
-		.fail(function () {
+		.fail(function (response) {
 			$.confirm({
 				type: "red",
 				icon: "fas fa-exclamation-triangle",
 				theme: "modern",
 				title: "Error!",
-				content: "Did you select file first?",
+				content: response.responseJSON ?
+					response.responseJSON.error : "Did you select files first?",
 				buttons: {
 					confirm: {
 						text: "Got it!",
@@ -190,6 +226,83 @@ function upload() {
 		})
 }
 
+// The last result of each request, with the tag the server gave it.
+const responseCache = {}
+
+/**
+ * Post json data and reuse the last result when the server answers that
+ * it did not change.
+ * @param {string} url The endpoint to post to.
+ * @param {string} data The json data to post.
+ * @returns {Promise} A promise of the result of the request.
+ */
+function cachedPost(url, data) {
+	const key = `${url} ${data}`
+	const cached = responseCache[key]
+
+	return $.ajax({
+		url: url,
+		type: "POST",
+		data: data,
+		contentType: "application/json; charset=utf-8",
+		headers: cached ? {"If-None-Match": cached.etag} : {}
+	})
+		.then(function (result, textStatus, jqXHR) {
+			if (jqXHR.status === 304) return cached.result
+
+			const etag = jqXHR.getResponseHeader("ETag")
+			if (etag) responseCache[key] = {etag: etag, result: result}
+			return result
+		})
+}
+
+// Milliseconds to wait between two polls of a running job.
+const jobPollInterval = 1000
+
+/**
+ * Run a request as a job on the server and poll until it is finished.
+ * @param {string} kind The kind of job, "small_series" or "cluster".
+ * @param {string} data The json data to post.
+ * @returns {Promise} A promise of the result of the job.
+ */
+function runJob(kind, data) {
+	const deferred = $.Deferred()
+
+	// Ask for the status of the job until it is done or failed.
+	function poll(jobId) {
+		$.getJSON(`/jobs/${jobId}`)
+			.done(function (job) {
+				if (job.status === "done") deferred.resolve(job.result)
+				else if (job.status === "failed") deferred.reject(job.error)
+				else setTimeout(poll, jobPollInterval, jobId)
+			})
+			.fail(deferred.reject)
+	}
+
+	$.ajax({
+		url: `/jobs/${kind}`,
+		type: "POST",
+		data: data,
+		contentType: "application/json; charset=utf-8"
+	})
+		.done(function (job) {
+			poll(job.id)
+		})
+		.fail(deferred.reject)
+
+	return deferred.promise()
+}
+
+/**
+ * Get the result of a request, comparing toads is run as a job.
+ * @param {string} kind The kind of request, "small_series" or "cluster".
+ * @returns {Promise} A promise of the result of the request.
+ */
+function getResult(kind) {
+	return getToggleStatus() ?
+		runJob(kind, getOption()) : cachedPost(`/${kind}`, getOption())
+}
+
 /**
  * Use an ajax call to get the parallel coordinate.
  */
@@ -202,15 +315,10 @@ function getSmallSeries() {
 	$("#spinner").css("display", "block")
 
 	// Do an ajax call to get the graph.
-	$.ajax({
-		url: "/small_series",
-		type: "POST",
-		data: getOption(),
-		contentType: "application/json; charset=utf-8"
-	})
+	getResult("small_series")
 		.done(function (result) {
-			// Put the result in to the proper html div.
-			$("#vis-holder-one").html(result)
+			// Draw the plot in to the proper html div.
+			drawSmallSeries(result)
 		})
 		.fail(
 			// When ajax has error, print in the console.
@@ -238,12 +346,7 @@ function getCluster() {
 	$("#spinner").css("display", "block")
 
 	// Do an ajax call to get the graph.
-	$.ajax({
-		url: "/cluster",
-		type: "POST",
-		data: getOption(),
-		contentType: "application/json; charset=utf-8"
-	})
+	getResult("cluster")
 		.done(function (result) {
 			// Put the result in to the proper html div.
 			$("#vis-holder-one").html(result["plot"])
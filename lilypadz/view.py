@@ -1,10 +1,17 @@
-from flask import Flask, request, render_template
+from flask import Flask, Response, request, render_template, jsonify
 
-from lilypadz.model.clustering import get_all_clustering_result, \
-    get_one_clustering_result
-from lilypadz.model.small_series import get_ss_for_one_toad, \
-    get_ss_for_multiple_toads, get_ss_for_one_toad_sight, \
-    get_ss_for_multiple_toads_sight
+from lilypadz.helper.constant import METRICS_ENABLED, SIMILAR_HOPS, \
+    WARM_UP_ON_START
+from lilypadz.helper.metrics import render_metrics
+from lilypadz.helper.response import conditional, compress_response
+from lilypadz.model.clustering import get_clustering_sweep
+from lilypadz.model.data_processor import get_processed_hop_cache_info
+from lilypadz.model.jobs import check_options, get_small_series, \
+    get_cluster, submit_job, get_job_status, is_job_pool_warm, warm_job_pool
+from lilypadz.model.ingest import ingest_hop
+from lilypadz.model.registry import get_registered_toad_hop
+from lilypadz.model.similarity import find_similar_hops
+from lilypadz.model.warm_up import start_warm_up, get_warm_up_progress
 
 # Set up the flask app with desired parameters.
 app = Flask(
@@ -13,77 +20,157 @@ app = Flask(
     template_folder="templates"
 )
 
+# Compress the large plot and table responses.
+app.after_request(compress_response)
+
+
+def warm_up_on_start():
+    """Process the data before the first request needs it, in this process and
+    in the job workers.
+
+    Call it once the server process started, never on import, as the job
+    workers import this module as well.
+    """
+    if WARM_UP_ON_START:
+        start_warm_up()
+        warm_job_pool()
+
 
 @app.route('/')
 def index():
     return render_template(
-        "index.html"
+        "index.html",
+        toads=list(get_registered_toad_hop().keys())
     )
 
 
 @app.route("/small_series", methods=["POST"])
+@conditional
 def small_series():
     options = request.json
-    if not options["sight"]:
-        if options["compare"]:
-            return get_ss_for_multiple_toads(
-                names=options["toads"].split("!"),
-                variable=options["variable"].split("!")
-            )
-        else:
-            return get_ss_for_one_toad(
-                name=options["toad"],
-                variable=options["variable"].split("!")
-            )
-    else:
-        if options["compare"]:
-            return get_ss_for_multiple_toads_sight(
-                names=options["toads"].split("!"),
-                variable=options["variable"].split("!")
-            )
-        else:
-            return get_ss_for_one_toad_sight(
-                name=options["toad"],
-                variable=options["variable"].split("!")
-            )
+    try:
+        check_options(kind="small_series", options=options)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+    return get_small_series(options=options)
 
 
 @app.route("/cluster", methods=["POST"])
+@conditional
 def cluster():
     options = request.json
-    if not options["sight"]:
-        if options["compare"]:
-            return get_all_clustering_result(
-                n_clusters=int(options["num_cluster"]),
-                names=options["toads"].split("!"),
-                variable=options["variable"].split("!")
-            )
-        else:
-            return get_one_clustering_result(
-                n_clusters=int(options["num_cluster"]),
-                name=options["toad"],
-                variable=options["variable"].split("!")
-            )
-    else:
-        if options["compare"]:
-            return get_all_clustering_result(
-                n_clusters=int(options["num_cluster"]),
-                names=options["toads"].split("!"),
-                variable=options["variable"].split("!")
-            )
-        else:
-            return get_one_clustering_result(
-                n_clusters=int(options["num_cluster"]),
-                name=options["toad"],
-                variable=options["variable"].split("!")
-            )
+    try:
+        check_options(kind="cluster", options=options)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+    return get_cluster(options=options)
+
+
+@app.route("/jobs/<kind>", methods=["POST"])
+def submit(kind):
+    try:
+        job_status = submit_job(kind=kind, options=request.json)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+    # Accepted, the result is polled for with the job id.
+    return jsonify(job_status._asdict()), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def poll(job_id):
+    job_status = get_job_status(job_id=job_id)
+    if job_status is None:
+        return jsonify(error=f"Unknown job {job_id}."), 404
+
+    return jsonify(job_status._asdict())
+
+
+@app.route("/cluster_sweep", methods=["POST"])
+@conditional
+def cluster_sweep():
+    options = request.json
+    try:
+        return get_clustering_sweep(
+            names=options["toads"].split("!") if options["compare"]
+            else [options["toad"]],
+            variable=options["variable"].split("!"),
+            k_min=int(options.get("k_min", 2)),
+            k_max=int(options.get("k_max", 10)),
+            random_state=int(options.get("seed", 0))
+        )
+    except KeyError as error:
+        return jsonify(error=f"Missing {error.args[0]}."), 400
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+
+@app.route("/similar", methods=["POST"])
+@conditional
+def similar():
+    options = request.json
+    try:
+        result = find_similar_hops(
+            name=options["toad"],
+            hop=int(options["hop"]),
+            variable=options["variable"].split("!"),
+            k=int(options.get("k", SIMILAR_HOPS)),
+            metric=options.get("metric", "euclidean")
+        )
+    except KeyError as error:
+        return jsonify(error=f"Missing {error.args[0]}."), 400
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+    return jsonify(
+        hops=[similar_hop._asdict() for similar_hop in result.hops],
+        computed=result.computed
+    )
+
+
+@app.route("/metrics")
+def metrics():
+    if not METRICS_ENABLED:
+        return jsonify(error="Metrics are turned off."), 404
+
+    return Response(
+        render_metrics(cache_info={
+            "processed_hop": get_processed_hop_cache_info()
+        }),
+        mimetype="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/ready")
+def ready():
+    # Only route traffic here once the warm up of this process finished. The
+    # job workers are only reported, a cold worker still runs its jobs.
+    progress = get_warm_up_progress()
+    workers_ready = is_job_pool_warm()
+    return jsonify(dict(progress._asdict(), workers_ready=workers_ready)), \
+        200 if progress.ready else 503
 
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    # Get the file from flask.
-    file = request.files["file"]
-    # Save the file to proper location
-    file.save("lilypadz/data/dummy")
-    # Return a dummy message to front end.
-    return "GOOD"
+    # Get the files and the hop information from flask.
+    files = request.files
+    options = request.form
+    try:
+        # The files are parsed from their streams and added to the store.
+        return jsonify(ingest_hop(
+            name=options["toad"],
+            hop=int(options["hop"]),
+            sight=options["sight"],
+            onset=float(options["onset"]),
+            first_touch=float(options["first_touch"]),
+            recovery=float(options["recovery"]),
+            xyz_file=files["xyz"].stream,
+            force_file=files["force"].stream
+        ))
+    except KeyError as error:
+        return jsonify(error=f"Missing {error.args[0]}."), 400
+    except ValueError as error:
+        return jsonify(error=str(error)), 400